@@ -5,25 +5,36 @@ import (
 	"bytes"
 	"encoding/json"
 	"fmt"
+	"io"
 	"log"
 	"net/http"
 	"os"
+	"strconv"
 	"time"
 
 	"github.com/HarshithRajesh/LogIQ/parser"
+	"github.com/HarshithRajesh/LogIQ/wire"
 )
 
 const (
 	ServerURL          = "http://localhost:8000/ingest"
+	PackedURL          = "http://localhost:8000/ingest/packed"
+	UsePackedFormat    = true // Send dictionary-encoded batches instead of JSON
 	BatchSize          = 50
 	DefaultNormalLimit = 5000 // Default: first 5000 logs are "normal", rest are "attack"
+	MaxSendAttempts    = 5    // Retries when the backend sheds load (429/503)
 )
 
 type LogData struct {
 	Content  string `json:"content"`
 	Template string `json:"template"`
+	Source   string `json:"source,omitempty"`
 }
 
+// Every line is tagged with this machine's hostname, so the backend keeps a
+// separate baseline per shipping host
+var source, _ = os.Hostname()
+
 func main() {
 	// Get log file from command line argument or use default
 	var logFile string
@@ -65,7 +76,7 @@ func main() {
 		rawLog := scanner.Text()
 		_, template := drain.Parse(rawLog)
 
-		batch = append(batch, LogData{Content: rawLog, Template: template})
+		batch = append(batch, LogData{Content: rawLog, Template: template, Source: source})
 
 		if len(batch) >= BatchSize {
 			sendBatch(batch)
@@ -98,7 +109,48 @@ func main() {
 	fmt.Println("\n✅ Log File processing complete.")
 }
 
+var packer = wire.NewEncoder()
+
+// encodeBatch returns the endpoint, content type and body for one batch.
+func encodeBatch(logs []LogData) (string, string, []byte) {
+	if !UsePackedFormat {
+		jsonData, _ := json.Marshal(logs)
+		return ServerURL, "application/json", jsonData
+	}
+	// Each HTTP request is decoded on its own, so it carries its own templates
+	packer.Reset()
+	packer.Source = source
+	for _, l := range logs {
+		packer.Add(l.Template, l.Content)
+	}
+	return PackedURL, wire.ContentType, packer.Encode()
+}
+
 func sendBatch(logs []LogData) {
-	jsonData, _ := json.Marshal(logs)
-	http.Post(ServerURL, "application/json", bytes.NewBuffer(jsonData))
+	url, contentType, body := encodeBatch(logs)
+
+	for attempt := 1; attempt <= MaxSendAttempts; attempt++ {
+		resp, err := http.Post(url, contentType, bytes.NewReader(body))
+		if err != nil {
+			return
+		}
+		// Drain and close the body so the keep-alive connection gets reused
+		io.Copy(io.Discard, resp.Body)
+		resp.Body.Close()
+
+		// Backend is overloaded: back off for as long as it asks, then retry
+		if resp.StatusCode != http.StatusTooManyRequests && resp.StatusCode != http.StatusServiceUnavailable {
+			return
+		}
+		time.Sleep(retryAfter(resp))
+	}
+}
+
+// retryAfter reads the Retry-After header (seconds), defaulting to 1s.
+func retryAfter(resp *http.Response) time.Duration {
+	seconds, err := strconv.Atoi(resp.Header.Get("Retry-After"))
+	if err != nil || seconds < 1 {
+		seconds = 1
+	}
+	return time.Duration(seconds) * time.Second
 }
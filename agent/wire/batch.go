@@ -0,0 +1,189 @@
+package wire
+
+// Dictionary-encoded batch format shared with backend/wire_format.py.
+//
+// A batch is one msgpack array: [1, firstID, [newTemplates...], [rows...]],
+// optionally followed by the name of the source (host/service) of all rows.
+// Templates are numbered consecutively from firstID and each row is
+// [templateID, params], where params is either the list of variable values
+// (<IP>/<HEX>/<NUM> in template order) or the raw line as a string when it
+// can't be rebuilt from its template.
+
+import (
+	"encoding/binary"
+	"regexp"
+	"strings"
+)
+
+const (
+	FormatVersion = 1
+	ContentType   = "application/x-logiq-batch"
+)
+
+var rePlaceholder = regexp.MustCompile(`<IP>|<HEX>|<NUM>`)
+
+// What each placeholder may stand for (mirrors parser/drain.go)
+var variablePatterns = map[string]string{
+	"<IP>":  `(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})`,
+	"<HEX>": `(0x[0-9a-fA-F]+)`,
+	"<NUM>": `(\d+)`,
+}
+
+type row struct {
+	templateID int
+	params     []string
+	raw        string
+}
+
+type Encoder struct {
+	Source       string // sent with every batch when not empty
+	ids          map[string]int
+	newTemplates []string
+	firstID      int
+	rows         []row
+	matchers     map[string]*regexp.Regexp
+}
+
+func NewEncoder() *Encoder {
+	return &Encoder{
+		ids:      make(map[string]int),
+		matchers: make(map[string]*regexp.Regexp),
+	}
+}
+
+// Add appends one log line with its Drain template.
+func (e *Encoder) Add(template, content string) {
+	// msgpack strings must be valid UTF-8 (encoding/json does the same)
+	template = strings.ToValidUTF8(template, "\uFFFD")
+	content = strings.ToValidUTF8(content, "\uFFFD")
+
+	id, ok := e.ids[template]
+	if !ok {
+		id = len(e.ids)
+		e.ids[template] = id
+		e.newTemplates = append(e.newTemplates, template)
+	}
+
+	m := e.matcher(template).FindStringSubmatch(content)
+	if m == nil {
+		e.rows = append(e.rows, row{templateID: id, raw: content})
+		return
+	}
+	e.rows = append(e.rows, row{templateID: id, params: m[1:]})
+}
+
+func (e *Encoder) Len() int {
+	return len(e.rows)
+}
+
+// Encode returns the pending rows as one batch. Templates already sent stay
+// in the dictionary, so later batches on the same connection reuse their IDs.
+func (e *Encoder) Encode() []byte {
+	fields := 4
+	if e.Source != "" {
+		fields = 5
+	}
+	buf := appendArrayHeader(nil, fields)
+	buf = appendUint(buf, FormatVersion)
+	buf = appendUint(buf, uint64(e.firstID))
+
+	buf = appendArrayHeader(buf, len(e.newTemplates))
+	for _, t := range e.newTemplates {
+		buf = appendString(buf, t)
+	}
+
+	buf = appendArrayHeader(buf, len(e.rows))
+	for _, r := range e.rows {
+		buf = appendArrayHeader(buf, 2)
+		buf = appendUint(buf, uint64(r.templateID))
+		if r.params == nil {
+			buf = appendString(buf, r.raw)
+			continue
+		}
+		buf = appendArrayHeader(buf, len(r.params))
+		for _, p := range r.params {
+			buf = appendString(buf, p)
+		}
+	}
+
+	if e.Source != "" {
+		buf = appendString(buf, strings.ToValidUTF8(e.Source, "\uFFFD"))
+	}
+
+	e.firstID = len(e.ids)
+	e.newTemplates = nil
+	e.rows = e.rows[:0]
+	return buf
+}
+
+// Reset forgets the template dictionary, e.g. before a standalone HTTP batch.
+func (e *Encoder) Reset() {
+	e.ids = make(map[string]int)
+	e.newTemplates = nil
+	e.firstID = 0
+	e.rows = e.rows[:0]
+}
+
+// matcher compiles (once per template) a regex capturing each variable value.
+func (e *Encoder) matcher(template string) *regexp.Regexp {
+	if re, ok := e.matchers[template]; ok {
+		return re
+	}
+	var pattern strings.Builder
+	pattern.WriteString(`^(?s:`)
+	last := 0
+	for _, loc := range rePlaceholder.FindAllStringIndex(template, -1) {
+		pattern.WriteString(regexp.QuoteMeta(template[last:loc[0]]))
+		pattern.WriteString(variablePatterns[template[loc[0]:loc[1]]])
+		last = loc[1]
+	}
+	pattern.WriteString(regexp.QuoteMeta(template[last:]))
+	pattern.WriteString(`)$`)
+
+	re := regexp.MustCompile(pattern.String())
+	e.matchers[template] = re
+	return re
+}
+
+// --- Minimal msgpack writer (arrays, strings, unsigned ints) ---
+
+func appendArrayHeader(buf []byte, n int) []byte {
+	switch {
+	case n < 16:
+		return append(buf, 0x90|byte(n))
+	case n < 1<<16:
+		return binary.BigEndian.AppendUint16(append(buf, 0xdc), uint16(n))
+	default:
+		return binary.BigEndian.AppendUint32(append(buf, 0xdd), uint32(n))
+	}
+}
+
+func appendString(buf []byte, s string) []byte {
+	n := len(s)
+	switch {
+	case n < 32:
+		buf = append(buf, 0xa0|byte(n))
+	case n < 1<<8:
+		buf = append(buf, 0xd9, byte(n))
+	case n < 1<<16:
+		buf = binary.BigEndian.AppendUint16(append(buf, 0xda), uint16(n))
+	default:
+		buf = binary.BigEndian.AppendUint32(append(buf, 0xdb), uint32(n))
+	}
+	return append(buf, s...)
+}
+
+func appendUint(buf []byte, v uint64) []byte {
+	switch {
+	case v < 128:
+		return append(buf, byte(v))
+	case v < 1<<8:
+		return append(buf, 0xcc, byte(v))
+	case v < 1<<16:
+		return binary.BigEndian.AppendUint16(append(buf, 0xcd), uint16(v))
+	case v < 1<<32:
+		return binary.BigEndian.AppendUint32(append(buf, 0xce), uint32(v))
+	default:
+		return binary.BigEndian.AppendUint64(append(buf, 0xcf), v)
+	}
+}
@@ -0,0 +1,104 @@
+"""
+Admission control for the ingest service.
+
+Tracks the service's own in-flight work (rows waiting to be written, DB write
+latency, connection pool saturation) and decides whether a new request should
+be accepted or shed with 429 / 503 plus a Retry-After hint.
+"""
+
+import math
+
+# Smoothing factor for the write latency / throughput moving averages
+EWMA_ALPHA = 0.2
+
+
+class AdmissionController:
+    def __init__(self, max_pending_rows, max_write_latency, max_pool_busy_ratio, max_retry_after=30):
+        self.max_pending_rows = max_pending_rows
+        self.max_write_latency = max_write_latency
+        self.max_pool_busy_ratio = max_pool_busy_ratio
+        self.max_retry_after = max_retry_after
+
+        self.in_flight_rows = 0  # rows being written synchronously by requests
+        self.write_latency = 0.0  # EWMA seconds per DB write
+        self.write_rate = 0.0  # EWMA rows/s the DB is absorbing
+
+        self.accepted_requests = 0
+        self.accepted_rows = 0
+        self.shed_requests = {}  # reason -> count
+        self.shed_rows = 0
+
+    def record_write(self, rows, seconds):
+        """Feed the outcome of one DB write into the latency / rate estimates."""
+        if seconds <= 0:
+            return
+        if self.write_rate == 0.0:
+            self.write_latency = seconds
+            self.write_rate = rows / seconds
+        else:
+            self.write_latency += EWMA_ALPHA * (seconds - self.write_latency)
+            self.write_rate += EWMA_ALPHA * (rows / seconds - self.write_rate)
+
+    def check(self, rows, queued_rows, pool, db_connected):
+        """
+        Decide whether to admit a request carrying `rows` rows.
+
+        Returns None to admit, or (status_code, reason, retry_after_seconds).
+        """
+        verdict = self._evaluate(rows, queued_rows, pool, db_connected)
+        if verdict is None:
+            self.accepted_requests += 1
+            self.accepted_rows += rows
+            return None
+        status, reason, retry_after = verdict
+        self.shed_requests[reason] = self.shed_requests.get(reason, 0) + 1
+        self.shed_rows += rows
+        return status, reason, min(max(math.ceil(retry_after), 1), self.max_retry_after)
+
+    def overloaded(self, queued_rows, pool, db_connected):
+        """Like check() for an empty request, without counting it."""
+        return self._evaluate(0, queued_rows, pool, db_connected) is not None
+
+    def _evaluate(self, rows, queued_rows, pool, db_connected):
+        pending = queued_rows + self.in_flight_rows
+
+        if not db_connected:
+            return 503, "database_unavailable", self.max_retry_after
+
+        if pending + rows > self.max_pending_rows:
+            # Enough work is queued; the producer should slow down for roughly
+            # as long as the DB needs to drain the backlog.
+            return 429, "pending_rows", self._drain_seconds(pending)
+
+        # Only judge latency while there is work outstanding; otherwise an old
+        # slow write would keep shedding requests with nothing left to update it.
+        if pending and self.write_latency > self.max_write_latency:
+            return 503, "write_latency", self.write_latency
+
+        if pool is not None:
+            busy = pool.get_size() - pool.get_idle_size()
+            if busy / pool.get_max_size() >= self.max_pool_busy_ratio:
+                return 503, "pool_saturated", self.write_latency
+
+        return None
+
+    def _drain_seconds(self, pending):
+        if self.write_rate <= 0:
+            return self.max_retry_after
+        return pending / self.write_rate
+
+    def stats(self):
+        return {
+            "in_flight_rows": self.in_flight_rows,
+            "write_latency_ms": round(self.write_latency * 1000, 2),
+            "write_rate_rows_per_s": round(self.write_rate, 1),
+            "accepted_requests": self.accepted_requests,
+            "accepted_rows": self.accepted_rows,
+            "shed_requests": dict(self.shed_requests),
+            "shed_rows": self.shed_rows,
+            "limits": {
+                "max_pending_rows": self.max_pending_rows,
+                "max_write_latency_ms": self.max_write_latency * 1000,
+                "max_pool_busy_ratio": self.max_pool_busy_ratio,
+            },
+        }
@@ -2,11 +2,28 @@ import time
 import psycopg2
 import numpy as np
 from collections import deque
+from loop_timing import TickClock, TickStats
 
 # --- CONFIGURATION ---
 WINDOW_SIZE = 10      
 CHECK_INTERVAL = 2    
 SIGMA_MULTIPLIER = 4  
+TICK_OFFSET = 0.3     # fixed-rate ticks, 0.3 s past a whole second (see analyzer_enhanced.py)
+SUMMARY_EVERY = 30    # ticks between timing summaries; 0 = off
+
+INSERT_ANOMALY_QUERY = """
+    INSERT INTO anomalies (log_count, description, deviation_score)
+    VALUES (%s, %s, %s)
+"""
+
+# Log count and templates of the last 2 complete seconds, read from the
+# per-second rollups the ingest service maintains (no scan of the logs table)
+WINDOW_QUERY = """
+    SELECT COALESCE(SUM(count), 0), ARRAY_AGG(DISTINCT template_id)
+    FROM log_rollups
+    WHERE bucket >= date_trunc('second', LOCALTIMESTAMP) - INTERVAL '2 seconds'
+      AND bucket < date_trunc('second', LOCALTIMESTAMP)
+"""
 
 history = deque(maxlen=WINDOW_SIZE)
 
@@ -18,6 +35,14 @@ def get_db_connection():
     except:
         return None
 
+def template_texts(cursor, template_ids):
+    """Look up the text of the given known_templates ids."""
+    cursor.execute(
+        "SELECT id, template FROM known_templates WHERE id = ANY(%s)",
+        (list(template_ids),),
+    )
+    return dict(cursor.fetchall())
+
 def analyze():
     print("🧠 AI Analyzer Started.")
     print("⏳ Waiting for data stream to build baseline...")
@@ -28,17 +53,26 @@ def analyze():
         time.sleep(2)
         conn = get_db_connection()
 
-    # In-memory set of templates we've already seen during the current run's
+    # In-memory set of template ids we've already seen during the current run's
     # LEARNING phase. This makes pattern anomalies depend on the normal
     # baseline of THIS run (e.g., the normal portion of final_demo.log),
     # not on everything that ever existed in the DB.
     seen_templates = set()
 
+    clock = TickClock(CHECK_INTERVAL, TICK_OFFSET)
+    ticks = TickStats(SUMMARY_EVERY)
+
     while True:
+        ticks.tick(clock.wait())
+        if ticks.due_summary():
+            print(ticks.summary(clock.missed))
         try:
             cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*), ARRAY_AGG(DISTINCT log_template) FROM logs WHERE received_at > NOW() - INTERVAL '2 seconds'")
-            row = cursor.fetchone()
+            with ticks.phase("fetch"):
+                cursor.execute(WINDOW_QUERY)
+                row = cursor.fetchone()
+                # End the read transaction: LOCALTIMESTAMP is frozen inside one
+                conn.commit()
             current_count = row[0]
             recent_templates = row[1] or []
             
@@ -46,21 +80,28 @@ def analyze():
             if len(history) < 5:
                 history.append(current_count)
                 # During learning, treat all observed templates as "normal".
-                for tpl in recent_templates:
-                    if tpl is not None:
-                        seen_templates.add(tpl)
+                for tpl_id in recent_templates:
+                    if tpl_id is not None:
+                        seen_templates.add(tpl_id)
                 print(f"[Learning] Data points: {len(history)}/5 | Current Traffic: {current_count} | Known templates: {len(seen_templates)}")
-                time.sleep(CHECK_INTERVAL)
                 continue
 
             # 2. STATISTICS PHASE
-            mean = np.mean(history)
-            std_dev = np.std(history)
-            effective_std = max(std_dev, 1.0, mean * 0.05)
-            threshold = mean + (SIGMA_MULTIPLIER * effective_std)
+            with ticks.phase("statistics"):
+                mean = np.mean(history)
+                std_dev = np.std(history)
+                effective_std = max(std_dev, 1.0, mean * 0.05)
+                threshold = mean + (SIGMA_MULTIPLIER * effective_std)
             
+            records = []
+
             # 3. DETECTION PHASE - FREQUENCY ANOMALIES (rate spikes)
-            if current_count > threshold:
+            with ticks.phase("frequency"):
+                spiked = current_count > threshold
+                if not spiked:
+                    # Do not add anomalies to history
+                    history.append(current_count)
+            if spiked:
                 # FIX: Convert numpy types to standard Python floats
                 z_score = float((current_count - mean) / effective_std)
                 
@@ -68,46 +109,34 @@ def analyze():
                 print(f"   Actual Traffic: {current_count} logs/s")
                 print(f"   Expected Max:   {int(threshold)} logs/s")
                 print(f"   Deviation:      {z_score:.2f}x Sigma")
-                
-                # Log to DB
-                cursor.execute("""
-                    INSERT INTO anomalies (log_count, description, deviation_score)
-                    VALUES (%s, %s, %s)
-                """, (current_count, f"[FREQUENCY] Spike: {current_count} (Limit: {int(threshold)})", z_score))
-                
-                conn.commit()
-                print("   -> Saved to DB ✅")
-                
-                # Do not add anomaly to history
+                records.append((current_count, f"[FREQUENCY] Spike: {current_count} (Limit: {int(threshold)})", z_score))
             else:
-                history.append(current_count)
                 print(f"[OK] Traffic: {current_count} | Threshold: {int(threshold)} | Baseline: {int(mean)}")
 
             # 4. DETECTION PHASE - PATTERN ANOMALIES (new templates)
-            pattern_anomalies = []
-            for tpl in recent_templates:
-                if tpl not in seen_templates:
-                    seen_templates.add(tpl)
-                    pattern_anomalies.append(tpl)
+            with ticks.phase("pattern"):
+                pattern_anomalies = []
+                for tpl_id in recent_templates:
+                    if tpl_id is not None and tpl_id not in seen_templates:
+                        seen_templates.add(tpl_id)
+                        pattern_anomalies.append(tpl_id)
+                texts = template_texts(cursor, pattern_anomalies) if pattern_anomalies else {}
 
-            for tpl in pattern_anomalies:
+            for tpl_id in pattern_anomalies:
+                tpl = texts.get(tpl_id, f"<template {tpl_id}>")
                 short_tpl = tpl if len(tpl) <= 180 else tpl[:177] + "..."
                 print("\n🧩 NEW TEMPLATE DETECTED!")
                 print(f"   Template: {short_tpl}")
+                records.append((0, f"[PATTERN] New template observed: {short_tpl}", 0.0))
 
-                cursor.execute(
-                    """
-                    INSERT INTO anomalies (log_count, description, deviation_score)
-                    VALUES (%s, %s, %s)
-                    """,
-                    (0, f"[PATTERN] New template observed: {short_tpl}", 0.0),
-                )
-
-            if pattern_anomalies:
-                conn.commit()
+            # 5. ANOMALY WRITE (one commit per tick)
+            if records:
+                with ticks.phase("write"):
+                    cursor.executemany(INSERT_ANOMALY_QUERY, records)
+                    conn.commit()
+                print("   -> Saved to DB ✅")
 
             cursor.close()
-            time.sleep(CHECK_INTERVAL)
             
         except Exception as e:
             print(f"Error: {e}")
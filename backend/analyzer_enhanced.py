@@ -2,22 +2,114 @@
 """
 Enhanced analyzer with mode support:
 - Fresh: Clears logs table and starts fresh (for new demo runs)
-- Continue: Analyzes existing logs (for resuming detection)
+- Continue: Analyzes existing logs (for resuming detection), warm-started
+  from the last checkpoint of the detector's state if there is a recent one
 """
 
+import atexit
 import time
-import psycopg2
 import numpy as np
-from collections import deque
+import psycopg2
+import signal
 import sys
+import checkpoint
+from baselines import StreamBaselines, make_baseline
+from detector import Anomaly, Detector, describe, shorten
+from loop_timing import SamplingProfiler, TickClock, TickStats
 
 # --- CONFIGURATION ---
 WINDOW_SIZE = 10
 CHECK_INTERVAL = 2
 SIGMA_MULTIPLIER = 3
 LEARNING_WINDOWS = 5   # Number of windows to learn baseline
+# Baseline engine (baselines.py): "window" = mean/std of the last WINDOW_SIZE
+# windows; "welford", "ewma" and "seasonal" (hour of day) keep long-term
+# baselines in constant space
+BASELINE_ENGINE = "window"
+
+# Per-template rate detection: every template gets its own EWMA baseline and
+# all of them are scored at once each tick (bursts and drops of one template
+# that the total count hides). More templates means more chances of a 3-sigma
+# fluke, hence the wider band.
+TEMPLATE_DETECTION = True
+TEMPLATE_SIGMA = 5
+TEMPLATE_HALF_LIFE = 600  # seconds
+TEMPLATE_MIN_COUNT = 20  # logs/window for a burst, baseline logs/window for a drop
+TEMPLATE_LEARNING_WINDOWS = 10  # windows a template is tracked before it is scored
+TEMPLATE_MAX_ANOMALIES = 10  # per tick, most deviant first
+
+# Per-source rate detection: the same, for each source's (host, service) total,
+# so a noisy host can't hide another one going quiet
+SOURCE_DETECTION = True
+SOURCE_SIGMA = 5
+SOURCE_HALF_LIFE = 600  # seconds
+SOURCE_MIN_COUNT = 20  # logs/window for a burst, baseline logs/window for a drop
+SOURCE_LEARNING_WINDOWS = 10  # windows a source is tracked before it is scored
+SOURCE_MAX_ANOMALIES = 10  # per tick, most deviant first
+
+# The detector's state (baselines, known templates) is saved to CHECKPOINT_PATH
+# every CHECKPOINT_EVERY ticks and on exit; "continue" runs load it and skip
+# the learning phase. A checkpoint older than CHECKPOINT_MAX_AGE seconds no
+# longer describes current traffic and is ignored. None = no checkpoints.
+CHECKPOINT_PATH = "analyzer_state.npz"
+CHECKPOINT_EVERY = 15  # ticks
+CHECKPOINT_MAX_AGE = 3600
+
+# Ticks run at a fixed rate: every CHECK_INTERVAL seconds, TICK_OFFSET seconds
+# past a whole second, so consecutive windows line up exactly. The offset gives
+# the ingest service's write-behind flush (FLUSH_MAX_LATENCY) time to land the
+# last second's rollups.
+TICK_OFFSET = 0.3
+SUMMARY_EVERY = 30  # ticks between timing summaries; 0 = off
+PROFILE_SAMPLE_INTERVAL = 0.001  # seconds between stack samples with --profile
 
-history = deque(maxlen=WINDOW_SIZE)
+INSERT_ANOMALY_QUERY = """
+    INSERT INTO anomalies (log_count, description, deviation_score)
+    VALUES (%s, %s, %s)
+"""
+
+# The last 2 complete seconds of the per-second rollups the ingest service
+# maintains (no scan of the logs table)
+WINDOW = """
+    bucket >= date_trunc('second', LOCALTIMESTAMP) - INTERVAL '2 seconds'
+    AND bucket < date_trunc('second', LOCALTIMESTAMP)
+"""
+
+# Log counts per (source, template) of the window, as three parallel arrays
+WINDOW_QUERY = f"""
+    SELECT ARRAY_AGG(source_id), ARRAY_AGG(template_id), ARRAY_AGG(n)
+    FROM (
+        SELECT source_id, template_id, SUM(count)::int AS n
+        FROM log_rollups
+        WHERE {WINDOW}
+        GROUP BY source_id, template_id
+    ) w
+"""
+
+# Without per-template rates only the per-source totals are needed, so the
+# transfer doesn't grow with the number of templates
+SOURCE_WINDOW_QUERY = f"""
+    SELECT ARRAY_AGG(source_id), ARRAY_AGG(n)
+    FROM (
+        SELECT source_id, SUM(count)::int AS n
+        FROM log_rollups
+        WHERE {WINDOW}
+        GROUP BY source_id
+    ) w
+"""
+
+# New-template detection, done by the database: the window's templates that
+# the analyzer hasn't learned yet (known_templates.learned_at IS NULL) are
+# marked as learned and returned with their text. Only genuinely new
+# templates cross the wire, however many the window holds. While learning,
+# the templates are marked and the result is ignored.
+NEW_TEMPLATES_QUERY = f"""
+    UPDATE known_templates k
+    SET learned_at = LOCALTIMESTAMP
+    FROM (SELECT DISTINCT template_id FROM log_rollups WHERE {WINDOW}) w
+    WHERE k.id = w.template_id AND k.learned_at IS NULL
+    RETURNING k.id, k.template
+"""
 
 def get_db_connection():
     try:
@@ -38,13 +130,13 @@ def clear_tables():
     
     try:
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM anomalies;")
-        cursor.execute("DELETE FROM logs;")
-        # Try to clear known_templates if it exists
-        try:
-            cursor.execute("DELETE FROM known_templates;")
-        except:
-            pass  # Table might not exist, that's ok
+        # TRUNCATE empties every logs partition at once instead of deleting
+        # (and later vacuuming) row by row
+        cursor.execute("TRUNCATE anomalies, logs, log_rollups;")
+        # known_templates is kept: it is the template dictionary the ingest
+        # service caches ids from. Only what the analyzer learned is
+        # forgotten, so "new template" detection starts over with this run.
+        cursor.execute("UPDATE known_templates SET learned_at = NULL WHERE learned_at IS NOT NULL;")
         conn.commit()
         print("✅ Tables cleared successfully")
         return True
@@ -56,6 +148,47 @@ def clear_tables():
         cursor.close()
         conn.close()
 
+def template_texts(cursor, template_ids):
+    """Look up the text of the given known_templates ids."""
+    cursor.execute(
+        "SELECT id, template FROM known_templates WHERE id = ANY(%s)",
+        (list(template_ids),),
+    )
+    return dict(cursor.fetchall())
+
+def source_names(cursor, source_ids):
+    """Look up the name of the given sources ids."""
+    cursor.execute("SELECT id, name FROM sources WHERE id = ANY(%s)", (list(source_ids),))
+    return {source_id: name or "<no source>" for source_id, name in cursor.fetchall()}
+
+def totals(ids, counts):
+    """Distinct ids and the sum of their counts."""
+    unique, inverse = np.unique(ids, return_inverse=True)
+    return unique, np.bincount(inverse, weights=counts, minlength=len(unique)).astype(np.int64)
+
+def warm_start(detector):
+    """Load the last checkpoint into the detector, if there is a usable one."""
+    started = time.perf_counter()
+    try:
+        age = checkpoint.load(CHECKPOINT_PATH, detector, CHECKPOINT_MAX_AGE)
+    except Exception as e:
+        print(f"⚠️ Ignoring checkpoint {CHECKPOINT_PATH}: {e}")
+        return
+    if age is None:
+        return
+    print(f"♻️  Warm start from {CHECKPOINT_PATH} ({age:.0f}s old, loaded in "
+          f"{(time.perf_counter() - started) * 1000:.1f} ms): "
+          f"{'still learning' if detector.learning else 'detection mode ACTIVE'}")
+
+def save_checkpoint(detector, quiet=False):
+    try:
+        size = checkpoint.save(CHECKPOINT_PATH, detector)
+    except Exception as e:
+        print(f"⚠️ CHECKPOINT ERROR: {e}")
+        return
+    if not quiet:
+        print(f"💾 Detector state saved to {CHECKPOINT_PATH} ({size / 1024:.0f} KB)")
+
 def analyze(mode="continue"):
     print("🧠 AI Analyzer Started.")
     
@@ -71,122 +204,164 @@ def analyze(mode="continue"):
         time.sleep(2)
         conn = get_db_connection()
 
-    # In-memory set of templates we've already seen during the current run's
-    # LEARNING phase. This makes pattern anomalies depend on the normal
-    # baseline of THIS run (e.g., the normal portion of final_demo.log),
-    # not on everything that ever existed in the DB.
-    seen_templates = set()
-    learning_phase = True
-    baseline_established = False
+    # Known templates are those the analyzer has seen (known_templates.
+    # learned_at, see NEW_TEMPLATES_QUERY), starting with this run's
+    # LEARNING phase in fresh mode. This makes pattern anomalies depend on
+    # the normal baseline of THIS run (e.g., the normal portion of
+    # final_demo.log), not on everything that ever existed in the DB.
+    template_baselines = source_baselines = None
+    if TEMPLATE_DETECTION:
+        template_baselines = StreamBaselines(TEMPLATE_HALF_LIFE, CHECK_INTERVAL, TEMPLATE_SIGMA,
+                                             TEMPLATE_MIN_COUNT, TEMPLATE_LEARNING_WINDOWS)
+    if SOURCE_DETECTION:
+        source_baselines = StreamBaselines(SOURCE_HALF_LIFE, CHECK_INTERVAL, SOURCE_SIGMA,
+                                           SOURCE_MIN_COUNT, SOURCE_LEARNING_WINDOWS)
+    detector = Detector(WINDOW_SIZE, SIGMA_MULTIPLIER, LEARNING_WINDOWS,
+                        make_baseline(BASELINE_ENGINE, WINDOW_SIZE, CHECK_INTERVAL),
+                        template_baselines, source_baselines)
+    if CHECKPOINT_PATH:
+        if mode == "continue":
+            warm_start(detector)
+        atexit.register(save_checkpoint, detector)
+    clock = TickClock(CHECK_INTERVAL, TICK_OFFSET)
+    ticks = TickStats(SUMMARY_EVERY)
+    tick_number = 0
+    learned_templates = 0
 
     while True:
+        ticks.tick(clock.wait())
+        tick_number += 1
+        if ticks.due_summary():
+            print(ticks.summary(clock.missed))
+        if CHECKPOINT_PATH and tick_number % CHECKPOINT_EVERY == 0:
+            with ticks.phase("checkpoint"):
+                save_checkpoint(detector, quiet=True)
         try:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT COUNT(*), ARRAY_AGG(DISTINCT log_template) 
-                FROM logs 
-                WHERE received_at > NOW() - INTERVAL '2 seconds'
-            """)
-            row = cursor.fetchone()
-            current_count = row[0]
-            recent_templates = row[1] or []
+            with ticks.phase("fetch"):
+                cursor.execute(WINDOW_QUERY if TEMPLATE_DETECTION else SOURCE_WINDOW_QUERY)
+                row = cursor.fetchone()
+            with ticks.phase("pattern"):
+                cursor.execute(NEW_TEMPLATES_QUERY)
+                new_templates = cursor.fetchall()
+                # End the transaction: LOCALTIMESTAMP is frozen inside one
+                conn.commit()
+            if TEMPLATE_DETECTION:
+                pair_counts = np.array(row[2] or [], dtype=np.int64)
+                recent_templates, template_counts = totals(np.array(row[1] or [], dtype=np.int64), pair_counts)
+                recent_sources, source_counts = totals(np.array(row[0] or [], dtype=np.int64), pair_counts)
+            else:
+                recent_sources = np.array(row[0] or [], dtype=np.int64)
+                source_counts = np.array(row[1] or [], dtype=np.int64)
+            current_count = int(source_counts.sum())
             
             # 1. POPULATE PHASE (learning baseline for rate + normal templates)
-            if learning_phase and len(history) < LEARNING_WINDOWS:
+            if detector.learning:
                 # Skip empty windows
                 if current_count == 0:
                     print(f"[Learning Phase] Waiting for logs... (No traffic yet)")
-                    time.sleep(CHECK_INTERVAL)
                     continue
 
-                # Record real traffic into baseline
-                history.append(current_count)
-                # During learning, treat all observed templates as "normal".
-                for tpl in recent_templates:
-                    if tpl is not None:
-                        seen_templates.add(tpl)
-                print(f"[Learning Phase] Data points: {len(history)}/{LEARNING_WINDOWS} | Current Traffic: {current_count} logs/s | Templates: {len(seen_templates)}")
-                time.sleep(CHECK_INTERVAL)
-                continue
+                # Record real traffic into baseline; during learning all
+                # observed templates are treated as "normal" (NEW_TEMPLATES_QUERY
+                # has already marked them as learned).
+                learned_templates += len(new_templates)
+                detector.observe(current_count, [])
+                if TEMPLATE_DETECTION:
+                    detector.check_template_counts(recent_templates, template_counts)
+                if SOURCE_DETECTION:
+                    detector.check_source_counts(recent_sources, source_counts)
+                print(f"[Learning Phase] Data points: {detector.learned_windows}/{LEARNING_WINDOWS} | Current Traffic: {current_count} logs/s | New templates: {learned_templates} | Sources: {len(recent_sources)}")
 
-            # Once learning is done, mark it
-            if learning_phase and len(history) >= LEARNING_WINDOWS:
-                learning_phase = False
-                baseline_established = True
-                mean = np.mean(history)
-                std_dev = np.std(history)
-                print(f"\n✅ BASELINE ESTABLISHED!")
-                print(f"   Mean: {int(mean)} logs/s | StdDev: {std_dev:.2f}")
-                print(f"   Known templates: {len(seen_templates)}")
-                print(f"   🚀 Detection mode ACTIVE\n")
-                time.sleep(CHECK_INTERVAL)
+                # Once learning is done, announce the baseline
+                if not detector.learning:
+                    print(f"\n✅ BASELINE ESTABLISHED!")
+                    mean, std = detector.engine.estimate(time.time())
+                    print(f"   Mean: {int(mean)} logs/s | StdDev: {std:.2f} | Engine: {BASELINE_ENGINE}")
+                    cursor.execute("SELECT count(*) FROM known_templates WHERE learned_at IS NOT NULL;")
+                    print(f"   Known templates: {cursor.fetchone()[0]}")
+                    conn.commit()
+                    print(f"   🚀 Detection mode ACTIVE\n")
                 continue
 
-            # 2. STATISTICS PHASE
-            mean = np.mean(history)
-            std_dev = np.std(history)
-            effective_std = max(std_dev, 1.0, mean * 0.05)
-            threshold = mean + (SIGMA_MULTIPLIER * effective_std)
-            
-            # 3. DETECTION PHASE - FREQUENCY ANOMALIES (rate spikes)
-            if current_count > threshold:
-                # FIX: Convert numpy types to standard Python floats
-                z_score = float((current_count - mean) / effective_std)
-                
+            # 2. STATISTICS + DETECTION PHASE (what Detector.observe does,
+            # step by step so each step is timed)
+            with ticks.phase("statistics"):
+                mean, _, threshold = detector.baseline()
+            with ticks.phase("frequency"):
+                spike = detector.check_count(current_count)
+                # The detector keeps spikes out of the rolling history
+                detector.close_window(current_count, spiked=spike is not None)
+            rate_anomalies = source_anomalies = []
+            if TEMPLATE_DETECTION:
+                with ticks.phase("templates"):
+                    rate_anomalies = detector.check_template_counts(recent_templates, template_counts)
+            if SOURCE_DETECTION:
+                with ticks.phase("sources"):
+                    source_anomalies = detector.check_source_counts(recent_sources, source_counts)
+            named_sources = source_anomalies[:SOURCE_MAX_ANOMALIES]
+            names = source_names(cursor, {a.template for a in named_sources}) if named_sources else {}
+            pattern_anomalies = [Anomaly("pattern", 0, 0.0, None, template_id) for template_id, _ in new_templates]
+            named_rates = rate_anomalies[:TEMPLATE_MAX_ANOMALIES]
+            texts = template_texts(cursor, {a.template for a in named_rates}) if named_rates else {}
+            texts.update(new_templates)
+
+            records = []
+
+            # 3. FREQUENCY ANOMALIES (rate spikes)
+            if spike is not None:
                 print(f"\n{'='*70}")
                 print(f"🚨 FREQUENCY ANOMALY DETECTED! 🚨")
                 print(f"{'='*70}")
                 print(f"   Actual Traffic:    {current_count} logs/s")
                 print(f"   Expected Max:      {int(threshold)} logs/s")
                 print(f"   Baseline Mean:     {int(mean)} logs/s")
-                print(f"   Deviation:         {z_score:.2f}x Sigma")
-                
-                # Log to DB
-                cursor.execute("""
-                    INSERT INTO anomalies (log_count, description, deviation_score)
-                    VALUES (%s, %s, %s)
-                """, (current_count, f"[FREQUENCY] Spike: {current_count} logs/s (Threshold: {int(threshold)})", z_score))
-                
-                conn.commit()
-                print("   ✅ Saved to database")
+                print(f"   Deviation:         {spike.deviation_score:.2f}x Sigma")
                 print(f"{'='*70}\n")
-                
-                # Do not add spike to history for next check
+                records.append((current_count, describe(spike), float(spike.deviation_score)))
             else:
-                # Add normal readings to rolling history
-                history.append(current_count)
-                status = "✅ NORMAL" if current_count <= threshold else "⚠️ WARNING"
-                print(f"[{status}] Traffic: {current_count:4d} logs/s | Threshold: {int(threshold):4d} | Baseline: {int(mean):4d}")
-
-            # 4. DETECTION PHASE - PATTERN ANOMALIES (new templates)
-            pattern_anomalies = []
-            for tpl in recent_templates:
-                if tpl not in seen_templates:
-                    seen_templates.add(tpl)
-                    pattern_anomalies.append(tpl)
-
-            for tpl in pattern_anomalies:
-                short_tpl = tpl if len(tpl) <= 180 else tpl[:177] + "..."
+                print(f"[✅ NORMAL] Traffic: {current_count:4d} logs/s | Threshold: {int(threshold):4d} | Baseline: {int(mean):4d}")
+
+            # 4. TEMPLATE RATE ANOMALIES (bursts / drops of single templates)
+            for anomaly in rate_anomalies[:TEMPLATE_MAX_ANOMALIES]:
+                short_tpl = shorten(texts.get(anomaly.template, f"<template {anomaly.template}>"))
+                mean, _ = template_baselines.estimate(anomaly.template)
+                change = "BURST" if anomaly.deviation_score > 0 else "DROP"
+                print(f"📈 TEMPLATE {change}: {anomaly.log_count} logs/window (baseline {mean:.0f}, "
+                      f"threshold {int(anomaly.threshold)}, {anomaly.deviation_score:+.2f}x sigma) | {short_tpl}")
+                records.append((anomaly.log_count, describe(anomaly, short_tpl), float(anomaly.deviation_score)))
+            if len(rate_anomalies) > TEMPLATE_MAX_ANOMALIES:
+                print(f"   ... and {len(rate_anomalies) - TEMPLATE_MAX_ANOMALIES} more templates out of their band")
+
+            # 5. SOURCE RATE ANOMALIES (a host / service bursting or going quiet)
+            for anomaly in named_sources:
+                name = names.get(anomaly.template, f"<source {anomaly.template}>")
+                mean, _ = source_baselines.estimate(anomaly.template)
+                change = "BURST" if anomaly.deviation_score > 0 else "DROP"
+                print(f"📡 SOURCE {change}: {anomaly.log_count} logs/window (baseline {mean:.0f}, "
+                      f"threshold {int(anomaly.threshold)}, {anomaly.deviation_score:+.2f}x sigma) | {name}")
+                records.append((anomaly.log_count, describe(anomaly, name), float(anomaly.deviation_score)))
+            if len(source_anomalies) > SOURCE_MAX_ANOMALIES:
+                print(f"   ... and {len(source_anomalies) - SOURCE_MAX_ANOMALIES} more sources out of their band")
+
+            # 6. PATTERN ANOMALIES (new templates)
+            for anomaly in pattern_anomalies:
+                short_tpl = shorten(texts.get(anomaly.template, f"<template {anomaly.template}>"))
                 print(f"\n{'='*70}")
                 print(f"🧩 PATTERN ANOMALY DETECTED - NEW TEMPLATE!")
                 print(f"{'='*70}")
                 print(f"   Template: {short_tpl}")
-
-                cursor.execute(
-                    """
-                    INSERT INTO anomalies (log_count, description, deviation_score)
-                    VALUES (%s, %s, %s)
-                    """,
-                    (0, f"[PATTERN] New template: {short_tpl}", 0.0),
-                )
-
-            if pattern_anomalies:
-                conn.commit()
-                print(f"   ✅ Saved to database")
                 print(f"{'='*70}\n")
+                records.append((0, describe(anomaly, short_tpl), 0.0))
+
+            # 7. ANOMALY WRITE (one commit for the whole tick)
+            if records:
+                with ticks.phase("write"):
+                    cursor.executemany(INSERT_ANOMALY_QUERY, records)
+                    conn.commit()
+                print(f"   ✅ Saved {len(records)} anomalies to database")
 
             cursor.close()
-            time.sleep(CHECK_INTERVAL)
             
         except Exception as e:
             print(f"Error: {e}")
@@ -196,13 +371,43 @@ def analyze(mode="continue"):
             except:
                 conn = get_db_connection()
 
+def profile_to(path):
+    """Sample the analyzer loop's stacks into `path` (folded format) until exit."""
+    profiler = SamplingProfiler(path, PROFILE_SAMPLE_INTERVAL)
+    profiler.start()
+    return profiler
+
 if __name__ == "__main__":
-    mode = sys.argv[1] if len(sys.argv) > 1 else "continue"
+    args = sys.argv[1:]
+    profile_path = None
+    if "--profile" in args:
+        i = args.index("--profile")
+        del args[i]
+        # FILE is optional, so a mode right after --profile is the mode
+        if i < len(args) and args[i] not in ("fresh", "continue"):
+            profile_path = args.pop(i)
+        else:
+            profile_path = "analyzer.folded"
+    mode = args[0] if args else "continue"
     
-    if mode not in ["fresh", "continue"]:
-        print("Usage: python analyzer_enhanced.py [fresh|continue]")
+    if mode not in ["fresh", "continue"] or len(args) > 1:
+        print("Usage: python analyzer_enhanced.py [fresh|continue] [--profile [FILE]]")
         print("  fresh:   Clear tables and start fresh demo run")
-        print("  continue: Analyze existing logs (default)")
+        print("  continue: Analyze existing logs (default), warm-started from the last checkpoint")
+        print("  --profile [FILE]: write sampled stacks of the loop to FILE (folded, for flamegraphs;"
+              " default analyzer.folded)")
         sys.exit(1)
     
-    analyze(mode)
+    # run_demo.sh stops the analyzer with SIGTERM; exit normally so the
+    # checkpoint (and profile) are written
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    profiler = profile_to(profile_path) if profile_path else None
+    try:
+        analyze(mode)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            print(f"🔥 Profile: {sum(profiler.stacks.values())} samples ({profiler.idle_samples} idle, "
+                  f"not included) written to {profile_path}")
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Offline backtest of the analyzer's detection rules over a log file.
+
+No database, agent or sleeps: the file is templated like the agent does it,
+every line gets a timestamp, the whole file is bucketed into CHECK_INTERVAL
+windows with NumPy, and the windows go through the same Detector that
+analyzer_enhanced.py uses, with its thresholds. The output is the anomaly
+records (log_count, description, deviation_score) the live analyzer would
+store. A file carries no source names, so every line counts for the empty
+source, as lines shipped without one do.
+
+Timelines:
+- synthetic (default): replays the agent's pacing; the first NORMAL_LIMIT
+  lines arrive at NORMAL_RATE logs/s, the rest at ATTACK_RATE logs/s
+- --embedded-timeline: uses the timestamp at the start of each line
+  (YYYY-MM-DD HH:MM:SS[.fff] or with a T, or the formats of the loghub
+  samples in agent/benchmark, see TIMESTAMP_FORMATS); lines without one
+  inherit the previous line's time
+
+--baseline NAME picks the baseline engine (baselines.py, default the
+analyzer's BASELINE_ENGINE). The synthetic timeline starts at the current
+time, so a seasonal baseline sees the current hour of day.
+
+Usage:
+    python backtest.py <log file> [--embedded-timeline] [--baseline NAME] [--json]
+"""
+
+import json
+import re
+import sys
+import time
+
+import numpy as np
+
+from analyzer_enhanced import (
+    BASELINE_ENGINE, CHECK_INTERVAL, LEARNING_WINDOWS, SIGMA_MULTIPLIER, SOURCE_DETECTION, SOURCE_HALF_LIFE,
+    SOURCE_LEARNING_WINDOWS, SOURCE_MAX_ANOMALIES, SOURCE_MIN_COUNT, SOURCE_SIGMA, TEMPLATE_DETECTION,
+    TEMPLATE_HALF_LIFE, TEMPLATE_LEARNING_WINDOWS, TEMPLATE_MAX_ANOMALIES, TEMPLATE_MIN_COUNT, TEMPLATE_SIGMA,
+    WINDOW_SIZE,
+)
+from baselines import ENGINES, StreamBaselines, make_baseline
+from detector import Detector, describe
+from drain import mask
+
+# --- CONFIGURATION ---
+# Synthetic timeline, mirroring agent/main.go
+NORMAL_LIMIT = 5000  # DefaultNormalLimit
+NORMAL_RATE = 100  # logs/s: the agent sleeps 10 ms per normal line
+ATTACK_RATE = 1000  # logs/s: no sleep, bounded by the HTTP round trips
+
+# Line-start timestamps of the bundled datasets, as (example, regex, match ->
+# ISO 8601). Formats without a year get YEARLESS (a leap year, for Feb 29), so
+# a file spanning New Year's Eve goes backwards in time.
+YEARLESS = "2000"
+MONTHS = {m: f"{i:02d}" for i, m in enumerate(
+    ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], 1)}
+TIMESTAMP_FORMATS = [
+    ("2017-06-09 20:10:40[.123]",
+     re.compile(r"^(\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2}:\d{2}(?:\.\d+)?)"),
+     lambda m: f"{m[1]}T{m[2]}"),
+    ("081109 203615 (HDFS)",
+     re.compile(r"^(\d{2})(\d{2})(\d{2}) (\d{2})(\d{2})(\d{2}) "),
+     lambda m: f"20{m[1]}-{m[2]}-{m[3]}T{m[4]}:{m[5]}:{m[6]}"),
+    ("17/06/09 20:10:40 (Spark)",
+     re.compile(r"^(\d{2})/(\d{2})/(\d{2}) (\d{2}:\d{2}:\d{2}) "),
+     lambda m: f"20{m[1]}-{m[2]}-{m[3]}T{m[4]}"),
+    ("20171223-22:15:29:606 (HealthApp)",
+     re.compile(r"^(\d{4})(\d{2})(\d{2})-(\d{1,2}):(\d{1,2}):(\d{1,2}):(\d{1,3})\|"),
+     lambda m: f"{m[1]}-{m[2]}-{m[3]}T{int(m[4]):02d}:{int(m[5]):02d}:{int(m[6]):02d}.{int(m[7]):03d}"),
+    ("03-17 16:13:38.811 (Android)",
+     re.compile(r"^(\d{2})-(\d{2}) (\d{2}:\d{2}:\d{2}\.\d{3}) "),
+     lambda m: f"{YEARLESS}-{m[1]}-{m[2]}T{m[3]}"),
+    ("Jun 14 15:16:01 (syslog: Linux, OpenSSH)",
+     re.compile(r"^([A-Z][a-z]{2}) +(\d{1,2}) (\d{2}:\d{2}:\d{2}) "),
+     lambda m: f"{YEARLESS}-{MONTHS[m[1]]}-{int(m[2]):02d}T{m[3]}" if m[1] in MONTHS else "NaT"),
+]
+
+
+def synthetic_timeline(n):
+    """Seconds since the first line, for n lines sent at the agent's pace."""
+    i = np.arange(n, dtype=np.float64)
+    return np.where(
+        i < NORMAL_LIMIT,
+        i / NORMAL_RATE,
+        NORMAL_LIMIT / NORMAL_RATE + (i - NORMAL_LIMIT) / ATTACK_RATE,
+    )
+
+
+def embedded_timeline(lines):
+    """Seconds since the first timestamped line, from the lines' own
+    timestamps, and that first timestamp (epoch seconds, read as UTC). The
+    format (TIMESTAMP_FORMATS) is the one of the first line that has one."""
+    fmt = next((f for line in lines for f in TIMESTAMP_FORMATS if f[1].match(line)), None)
+    if fmt is None:
+        raise ValueError("no line starts with a timestamp in a known format ("
+                         + "; ".join(example for example, _, _ in TIMESTAMP_FORMATS)
+                         + "); use the synthetic timeline")
+    _, regex, to_iso = fmt
+    stamps = np.array(
+        [to_iso(m) if (m := regex.match(line)) else "NaT" for line in lines],
+        dtype="datetime64[ms]",
+    )
+    known = ~np.isnat(stamps)
+    # Forward-fill lines without a timestamp (leading ones take the first stamp)
+    last_known = np.maximum.accumulate(np.where(known, np.arange(len(stamps)), -1))
+    stamps = stamps[np.where(last_known < 0, known.argmax(), last_known)]
+    origin = stamps.min()
+    return (stamps - origin).astype(np.float64) / 1000, origin.astype(np.int64) / 1000
+
+
+def bucket(times, templates):
+    """Per-window log counts, the templates first seen in each window, the
+    (template index array, count array) of each window and the template
+    texts by index."""
+    windows = (times // CHECK_INTERVAL).astype(np.int64)
+    windows -= windows.min()
+    counts = np.bincount(windows)
+
+    uniques, inverse = np.unique(np.array(templates, dtype=object), return_inverse=True)
+    _, first_line = np.unique(inverse, return_index=True)
+    first_window = windows[first_line]
+    new_templates = [[] for _ in counts]
+    for w in np.argsort(first_window, kind="stable"):
+        new_templates[first_window[w]].append(uniques[w])
+
+    # (window, template) pairs with their counts, sorted by window
+    pairs, pair_counts = np.unique(windows * len(uniques) + inverse, return_counts=True)
+    splits = np.searchsorted(pairs // len(uniques), np.arange(1, len(counts)))
+    per_template = list(zip(np.split(pairs % len(uniques), splits), np.split(pair_counts, splits)))
+    return counts, new_templates, per_template, uniques
+
+
+def backtest(lines, embedded=False, engine=BASELINE_ENGINE):
+    """Returns the anomaly records, each with the window it was raised in."""
+    if embedded:
+        times, origin = embedded_timeline(lines)
+    else:
+        times, origin = synthetic_timeline(len(lines)), time.time()
+    counts, new_templates, per_template, texts = bucket(times, [mask(line) for line in lines])
+
+    # Templates already seen don't need to be passed again: the detector
+    # remembers every template it was given.
+    template_baselines = None
+    if TEMPLATE_DETECTION:
+        template_baselines = StreamBaselines(TEMPLATE_HALF_LIFE, CHECK_INTERVAL, TEMPLATE_SIGMA,
+                                             TEMPLATE_MIN_COUNT, TEMPLATE_LEARNING_WINDOWS)
+    source_baselines = None
+    if SOURCE_DETECTION:
+        source_baselines = StreamBaselines(SOURCE_HALF_LIFE, CHECK_INTERVAL, SOURCE_SIGMA,
+                                           SOURCE_MIN_COUNT, SOURCE_LEARNING_WINDOWS)
+    detector = Detector(WINDOW_SIZE, SIGMA_MULTIPLIER, LEARNING_WINDOWS,
+                        make_baseline(engine, WINDOW_SIZE, CHECK_INTERVAL), template_baselines, source_baselines)
+    # A file is one source: every line is stored with the empty source (ID 0)
+    no_source = np.zeros(0, dtype=np.int64)
+    records = []
+    for window, (count, templates) in enumerate(zip(counts.tolist(), new_templates)):
+        at = origin + window * CHECK_INTERVAL
+        # Template and source rates are scored like the analyzer does it:
+        # after the total, on the window's counts (the learning phase included)
+        scored = count or not detector.learning
+        anomalies = detector.observe(count, templates, at=at)
+        if TEMPLATE_DETECTION and scored:
+            anomalies += detector.check_template_counts(*per_template[window], at=at)[:TEMPLATE_MAX_ANOMALIES]
+        if SOURCE_DETECTION and scored:
+            # An empty window has no rows, so no source either
+            ids, totals = (np.array([0]), np.array([count])) if count else (no_source, no_source)
+            anomalies += detector.check_source_counts(ids, totals, at=at)[:SOURCE_MAX_ANOMALIES]
+        for anomaly in anomalies:
+            if anomaly.kind == "template":
+                text = texts[anomaly.template]
+            elif anomaly.kind == "source":
+                text = "<no source>"  # analyzer_enhanced.source_names() for the empty source
+            else:
+                text = None
+            records.append({
+                "window": window,
+                "window_start": window * CHECK_INTERVAL,
+                "log_count": anomaly.log_count,
+                "description": describe(anomaly, text),
+                "deviation_score": float(anomaly.deviation_score),
+            })
+    return records, len(counts)
+
+
+def main():
+    argv = sys.argv[1:]
+    engine = BASELINE_ENGINE
+    if "--baseline" in argv:
+        i = argv.index("--baseline")
+        engine = argv[i + 1] if i + 1 < len(argv) else ""
+        del argv[i:i + 2]
+    args = [a for a in argv if not a.startswith("--")]
+    if len(args) != 1 or engine not in ENGINES:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    embedded = "--embedded-timeline" in argv
+    as_json = "--json" in argv
+
+    start = time.perf_counter()
+    with open(args[0], encoding="utf-8", errors="replace") as f:
+        lines = [line.rstrip("\n") for line in f if line.strip()]
+    try:
+        records, windows = backtest(lines, embedded, engine)
+    except ValueError as e:
+        if not embedded:
+            raise
+        print(f"❌ --embedded-timeline: {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+
+    if as_json:
+        print(json.dumps(records, indent=2))
+        return
+    print(f"🧪 Backtest: {args[0]} ({len(lines)} lines, {windows} windows of {CHECK_INTERVAL}s, "
+          f"{'embedded' if embedded else 'synthetic'} timeline)")
+    print(f"   Sigma: {SIGMA_MULTIPLIER} | Learning windows: {LEARNING_WINDOWS} | Baseline: {engine}"
+          + (f" (last {WINDOW_SIZE} windows)" if engine == "window" else ""))
+    for r in records:
+        print(f"   [t={r['window_start']:6.0f}s] {r['description']} (score {r['deviation_score']:.2f})")
+    frequency = sum(r["description"].startswith("[FREQUENCY]") for r in records)
+    template = sum(r["description"].startswith("[TEMPLATE]") for r in records)
+    source = sum(r["description"].startswith("[SOURCE]") for r in records)
+    print(f"\n🚨 {len(records)} anomalies ({frequency} frequency, {template} template, {source} source, "
+          f"{len(records) - frequency - template - source} pattern) "
+          f"in {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+Baseline engines for the frequency detector (detector.Detector).
+
+An engine learns what a normal window looks like from the windows it is
+given (spikes are kept out by the detector) and returns the expected count
+and its standard deviation for a window (estimate), once it can judge one
+(ready). Each update is O(1) and the state
+is a handful of floats or small NumPy arrays, so a baseline can span days
+without keeping any history.
+
+- window:   mean / std of the last `size` windows (the original behavior).
+            Ring buffer plus running sums.
+- welford:  mean / std of every window seen (Welford's algorithm). Never
+            forgets, so it suits steady traffic only.
+- ewma:     exponentially weighted mean / variance with a half-life in
+            seconds. Old windows fade out smoothly instead of all at once.
+- seasonal: Holt-Winters-style additive model, without trend: a slow EWMA
+            level plus one seasonal offset and one residual variance per
+            slot of the period (by default hour of day). The expected count
+            for a window is level + offset of its hour, so a daily peak is
+            not a spike. Each slot learns from its first `slot_learning`
+            windows before any of them can be a spike (ready() is False
+            meanwhile); until then its estimate uses the overall residual
+            variance.
+
+StreamBaselines is the many-streams counterpart of ewma: one EWMA mean and
+variance per stream (a template, a source), in NumPy arrays indexed by the
+stream's integer ID, all updated and scored together in one vectorized pass
+per window. 10k streams cost about as much as a few.
+
+The EWMA-based engines take half-lives in seconds and derive the smoothing
+factor from the time between updates, so they don't depend on the window
+length. Detector.baseline() turns (mean, std) into a threshold with the
+effective_std / sigma_multiplier rules, whatever the engine.
+"""
+
+import math
+import time
+
+import numpy as np
+
+ENGINES = ("window", "welford", "ewma", "seasonal")
+
+
+def _alpha(dt, half_life, n):
+    """Smoothing factor for the n-th update, `dt` seconds after the previous
+    one. Never below 1/n, so a young baseline is a plain running mean /
+    variance until enough time has passed for the half-life to take over
+    (otherwise the first windows would barely move it)."""
+    return max(1.0 - 0.5 ** (dt / half_life), 1.0 / n)
+
+
+class WindowBaseline:
+    STATE = ("values", "count", "_next", "_sum", "_sum_sq")  # see engine_state()
+
+    def __init__(self, size=10):
+        self.values = np.zeros(size)
+        self.count = 0
+        self._next = 0
+        self._sum = 0.0
+        self._sum_sq = 0.0
+
+    def update(self, x, at=None):
+        if self.count == len(self.values):
+            old = self.values[self._next]
+            self._sum -= old
+            self._sum_sq -= old * old
+        else:
+            self.count += 1
+        self.values[self._next] = x
+        self._next = (self._next + 1) % len(self.values)
+        self._sum += x
+        self._sum_sq += x * x
+
+    def ready(self, at=None):
+        return self.count > 0
+
+    def estimate(self, at=None):
+        mean = self._sum / self.count
+        return mean, math.sqrt(max(self._sum_sq / self.count - mean * mean, 0.0))
+
+
+class WelfordBaseline:
+    STATE = ("count", "mean", "_m2")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, x, at=None):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+    def ready(self, at=None):
+        return self.count > 0
+
+    def estimate(self, at=None):
+        return self.mean, math.sqrt(self._m2 / self.count)
+
+
+class EwmaBaseline:
+    STATE = ("count", "mean", "var", "_last")
+
+    def __init__(self, half_life=600.0, interval=2.0):
+        self.half_life = half_life
+        self.interval = interval  # assumed spacing when updates carry no time
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self._last = None
+
+    def update(self, x, at=None):
+        at = self._last + self.interval if at is None and self._last is not None else at
+        self.count += 1
+        if self.count == 1:
+            self.mean, self._last = float(x), at
+            return
+        a = _alpha(self.interval if at is None else max(at - self._last, 0.0), self.half_life, self.count)
+        diff = x - self.mean
+        self.mean += a * diff
+        self.var = (1 - a) * (self.var + a * diff * diff)
+        self._last = at
+
+    def ready(self, at=None):
+        return self.count > 0
+
+    def estimate(self, at=None):
+        return self.mean, math.sqrt(self.var)
+
+
+class SeasonalBaseline:
+    STATE = ("count", "level", "var", "season", "season_var", "seen", "_last")
+
+    def __init__(self, period=86_400, slots=24, level_half_life=86_400.0, season_half_life_periods=3.0,
+                 slot_learning=30, utc_offset=None):
+        self.period = period
+        self.slot_seconds = period / slots
+        self.level_half_life = level_half_life
+        # A slot only learns while traffic is in it, so its half-life is
+        # counted in "time spent in the slot": N periods = N * slot_seconds
+        self.season_half_life = season_half_life_periods * self.slot_seconds
+        # Updates a slot needs before it is trusted (ready). Until then no
+        # window there counts as a spike: spikes are never fed back, so a
+        # slot judged before it had learned would stay stuck below traffic
+        # it has never been given.
+        self.slot_learning = slot_learning
+        self.utc_offset = -time.timezone if utc_offset is None else utc_offset
+        self.count = 0
+        self.level = 0.0
+        self.var = 0.0  # residual variance over all slots
+        self.season = np.zeros(slots)  # additive offset per slot
+        self.season_var = np.zeros(slots)  # residual variance per slot
+        self.seen = np.zeros(slots, dtype=np.int64)  # updates per slot
+        self._last = None
+
+    def slot(self, at):
+        return int((at + self.utc_offset) % self.period // self.slot_seconds)
+
+    def update(self, x, at=None):
+        at = time.time() if at is None else at
+        k = self.slot(at)
+        self.count += 1
+        if self.count == 1:
+            self.level, self._last = float(x), at
+            self.seen[k] = 1
+            return
+        dt = max(at - self._last, 0.0)
+        self._last = at
+
+        self.seen[k] += 1
+        residual = x - (self.level + self.season[k])
+        a = _alpha(dt, self.season_half_life, self.seen[k])
+        self.season_var[k] = (1 - a) * (self.season_var[k] + a * residual * residual)
+        b = _alpha(dt, self.level_half_life, self.count)
+        self.var = (1 - b) * (self.var + b * residual * residual)
+
+        self.level += b * (x - self.season[k] - self.level)
+        self.season[k] += a * (x - self.level - self.season[k])
+
+    def estimate(self, at=None):
+        k = self.slot(time.time() if at is None else at)
+        var = self.season_var[k] if self.seen[k] > 1 else self.var
+        return self.level + float(self.season[k]), math.sqrt(var)
+
+    def ready(self, at=None):
+        return self.seen[self.slot(time.time() if at is None else at)] >= self.slot_learning
+
+
+class StreamBaselines:
+    STATE = ("mean", "var", "seen", "_last")
+
+    def __init__(self, half_life=600.0, interval=2.0, sigma_multiplier=5, min_count=20, learning=10,
+                 capacity=1024):
+        self.half_life = half_life
+        self.interval = interval  # assumed spacing when updates carry no time
+        self.sigma_multiplier = sigma_multiplier
+        # Bursts need at least min_count logs in the window, drops a mean of
+        # at least min_count: a quiet stream going from 2 to 9 is noise
+        self.min_count = min_count
+        self.learning = learning  # windows a stream is tracked before it is scored
+        self.mean = np.zeros(capacity)
+        self.var = np.zeros(capacity)
+        self.seen = np.zeros(capacity, dtype=np.int64)  # windows since first appearance
+        self._last = None
+
+    def _grow(self, max_id):
+        capacity = len(self.mean)
+        while capacity <= max_id:
+            capacity *= 2
+        for name in ("mean", "var", "seen"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def observe(self, ids, counts, at=None):
+        """Score a window holding counts[i] logs of stream ids[i] (streams
+        absent from it count 0), then add it to the baselines. Returns the
+        (ids, counts, means, stds, thresholds, scores) arrays of the streams
+        outside mean ± sigma * std, most deviant first; scores are negative
+        for drops.
+
+        Values outside the band are clipped to it before the update: a single
+        burst barely moves a baseline, but a lasting change of level is
+        learned at the EWMA's pace instead of alarming forever."""
+        ids = np.asarray(ids, dtype=np.int64)
+        counts = np.asarray(counts, dtype=np.float64)
+        if len(ids) and ids.max() >= len(self.mean):
+            self._grow(int(ids.max()))
+        at = (self._last + self.interval if self._last is not None else time.time()) if at is None else at
+        dt = self.interval if self._last is None else max(at - self._last, 0.0)
+        self._last = at
+
+        x = np.zeros(len(self.mean))
+        x[ids] = counts
+        new = np.zeros(len(self.mean), dtype=bool)
+        new[ids] = self.seen[ids] == 0
+        active = (self.seen > 0) | new
+
+        # Same floor as Detector.baseline, plus Poisson noise (sqrt(mean))
+        # so that low-volume streams aren't judged on a near-zero variance
+        std = np.maximum.reduce([np.sqrt(self.var), np.sqrt(self.mean), np.full_like(self.mean, 1.0),
+                                 self.mean * 0.05])
+        upper = self.mean + self.sigma_multiplier * std
+        lower = self.mean - self.sigma_multiplier * std
+        scored = active & ~new & (self.seen >= self.learning)
+        burst = scored & (x > upper) & (x >= self.min_count)
+        drop = scored & (x < lower) & (self.mean >= self.min_count)
+        flagged = np.flatnonzero(burst | drop)
+        scores = (x[flagged] - self.mean[flagged]) / std[flagged]
+        order = np.argsort(-np.abs(scores), kind="stable")
+        flagged, scores = flagged[order], scores[order]
+        result = (flagged, x[flagged], self.mean[flagged], std[flagged],
+                  np.where(scores > 0, upper[flagged], lower[flagged]), scores)
+
+        # Update: new streams start at their first count, the others move
+        # towards their (clipped) count
+        old = active & ~new
+        self.seen[active] += 1
+        a = np.maximum(1.0 - 0.5 ** (dt / self.half_life), 1.0 / np.maximum(self.seen, 1))
+        target = np.clip(x, np.maximum(lower, 0.0), upper)
+        diff = np.where(old, target - self.mean, 0.0)
+        self.mean = np.where(new, x, self.mean + a * diff)
+        self.var = np.where(old, (1 - a) * (self.var + a * diff * diff), self.var)
+        return result
+
+    def estimate(self, stream_id):
+        """(mean, std) of one stream's baseline, (0, 0) if never seen."""
+        if stream_id >= len(self.mean):
+            return 0.0, 0.0
+        return float(self.mean[stream_id]), math.sqrt(self.var[stream_id])
+
+
+def engine_state(engine, prefix=""):
+    """The learned state of an engine as {prefix + attribute: array}, for
+    np.savez. Tuning (sizes, half-lives) isn't included: it comes from the
+    configuration the engine is rebuilt with."""
+    state = {prefix + "engine": np.array(type(engine).__name__)}
+    for name in engine.STATE:
+        value = getattr(engine, name)
+        state[prefix + name] = np.asarray(np.nan if value is None else value)
+    return state
+
+
+def load_engine_state(engine, state, prefix=""):
+    """Restore what engine_state() saved into an engine built with the same
+    configuration. Raises ValueError if it doesn't fit."""
+    kind = str(state[prefix + "engine"])
+    if kind != type(engine).__name__:
+        raise ValueError(f"checkpoint holds a {kind}, expected a {type(engine).__name__}")
+    restored = {}
+    for name in engine.STATE:
+        value = state[prefix + name]
+        current = getattr(engine, name)
+        if isinstance(current, np.ndarray):
+            # Fixed-size arrays (window, seasonal slots) must keep their size;
+            # StreamBaselines arrays grow, so any size fits
+            if not isinstance(engine, StreamBaselines) and value.shape != current.shape:
+                raise ValueError(f"checkpoint {name} has shape {value.shape}, expected {current.shape}")
+            restored[name] = value.astype(current.dtype)
+        else:
+            value = value.item()
+            restored[name] = None if isinstance(value, float) and math.isnan(value) else value
+    for name, value in restored.items():
+        setattr(engine, name, value)
+
+
+def make_baseline(name, window_size=10, interval=2.0):
+    """An engine by name, with its default tuning; window_size only applies
+    to "window", interval (seconds per window) to "ewma"."""
+    if name == "window":
+        return WindowBaseline(window_size)
+    if name == "welford":
+        return WelfordBaseline()
+    if name == "ewma":
+        return EwmaBaseline(interval=interval)
+    if name == "seasonal":
+        return SeasonalBaseline()
+    raise ValueError(f"Unknown baseline engine {name!r} (expected one of {ENGINES})")
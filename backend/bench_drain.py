@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Throughput of server-side templating (drain.py) in lines/s.
+
+For each dataset it reports masking alone (drain.mask) and the full
+DrainParser.parse (masking + signature lookup), best of REPEATS runs over
+the file repeated COPIES times. The unguarded three-pass masking from
+drain.go is timed too, as a reference for the "." / "0x" prefilters.
+
+Usage:
+    python bench_drain.py [log files...]   (default: agent/benchmark/*_2k.log)
+"""
+
+import glob
+import os
+import sys
+import time
+
+from drain import RE_HEX, RE_IP, RE_NUM, DrainParser, mask
+
+DEFAULT_FILES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "..", "agent", "benchmark", "*_2k.log")))
+COPIES = 5
+REPEATS = 5
+
+
+def mask_three_pass(line):
+    line = RE_IP.sub("<IP>", line)
+    line = RE_HEX.sub("<HEX>", line)
+    return RE_NUM.sub("<NUM>", line)
+
+
+def lines_per_second(fn, lines):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for line in lines:
+            fn(line)
+        best = min(best, time.perf_counter() - start)
+    return len(lines) / best
+
+
+def main():
+    files = sys.argv[1:] or DEFAULT_FILES
+    print("🔎 Server-side templating throughput (lines/s)")
+    print(f"{'dataset':<20}{'3-pass mask':>14}{'mask':>12}{'parse':>12}{'signatures':>12}")
+    total_lines = total_time = 0
+    for path in files:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            lines = [line.rstrip("\n") for line in f] * COPIES
+        assert all(mask(line) == mask_three_pass(line) for line in lines)
+
+        parser = DrainParser()
+        three_pass = lines_per_second(mask_three_pass, lines)
+        masked = lines_per_second(mask, lines)
+        parsed = lines_per_second(lambda line: parser.parse(line), lines)
+        total_lines += len(lines)
+        total_time += len(lines) / parsed
+        print(f"{os.path.basename(path):<20}{three_pass:>14,.0f}{masked:>12,.0f}{parsed:>12,.0f}"
+              f"{parser.stats()['signatures']:>12}")
+    print(f"\nOverall parse throughput: {total_lines / total_time:,.0f} lines/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Size and throughput report for RAW_CONTENT_STORAGE = "params" vs "full".
+
+For each dataset it checks that every line is rebuilt exactly, then reports:
+- bytes of raw line text vs bytes of extracted variable values
+- encode (split_params) and decode (render) throughput in lines/s
+- on-disk size of a logs-shaped table under each mode, if Postgres is up
+  (rows are loaded REPEAT times into temporary tables; nothing is kept)
+
+Usage:
+    python bench_storage.py [log files...]   (default: agent/benchmark/*_2k.log)
+"""
+
+import asyncio
+import glob
+import os
+import sys
+import time
+
+import asyncpg
+
+from drain import mask
+from log_codec import render, split_params
+from settings import DB_CONFIG
+from storage import LOG_COLUMNS, encode_rows
+
+DEFAULT_FILES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "..", "agent", "benchmark", "*_2k.log")))
+REPEAT = 25
+
+
+def load_rows(path):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        # Postgres text can't hold NUL bytes
+        lines = [line.rstrip("\n").replace("\x00", "") for line in f if line.strip()]
+    return [(mask(line), line, "") for line in lines]
+
+
+def measure_codec(rows):
+    start = time.perf_counter()
+    encoded = [(template, split_params(template, content)) for template, content, _ in rows]
+    encode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decoded = [render(template, params) if params is not None else content
+               for (template, params), (_, content, _) in zip(encoded, rows)]
+    decode_time = time.perf_counter() - start
+
+    assert decoded == [content for _, content, _ in rows], "lines did not round-trip"
+    return {
+        "templates": len({template for template, _, _ in rows}),
+        "raw_fallback": sum(params is None for _, params in encoded),
+        "raw_bytes": sum(len(content.encode()) for _, content, _ in rows),
+        "params_bytes": sum(len(v.encode()) for _, params in encoded if params for v in params),
+        "encode_lines_per_s": len(rows) / encode_time,
+        "decode_lines_per_s": len(rows) / decode_time,
+    }
+
+
+async def measure_table_sizes(conn, rows):
+    ids = {}
+    for template, _, _ in rows:
+        ids.setdefault(template, len(ids) + 1)
+    sizes = {}
+    for mode in ("full", "params"):
+        table = f"bench_logs_{mode}"
+        await conn.execute(f"CREATE TEMP TABLE {table} (LIKE logs INCLUDING DEFAULTS)")
+        for _ in range(REPEAT):
+            await conn.copy_records_to_table(table, records=encode_rows(rows, ids, {"": 0}, mode), columns=LOG_COLUMNS)
+        await conn.execute(f"VACUUM ANALYZE {table}")
+        sizes[mode] = await conn.fetchval(f"SELECT pg_table_size('{table}')")
+        await conn.execute(f"DROP TABLE {table}")
+    return sizes
+
+
+async def main():
+    files = sys.argv[1:] or DEFAULT_FILES
+    try:
+        conn = await asyncpg.connect(**DB_CONFIG)
+    except (OSError, asyncpg.PostgresError) as e:
+        print(f"⚠️ Postgres not reachable ({e}); skipping on-disk sizes")
+        conn = None
+
+    print("🗜  Template + params storage vs full raw_content")
+    print(f"{'dataset':<20}{'tpls':>6}{'raw KB':>9}{'params KB':>11}{'ratio':>8}"
+          f"{'encode l/s':>12}{'decode l/s':>12}{'table full':>12}{'table params':>14}")
+    for path in files:
+        rows = load_rows(path)
+        r = measure_codec(rows)
+        line = (
+            f"{os.path.basename(path):<20}{r['templates']:>6}"
+            f"{r['raw_bytes'] / 1024:>9.1f}{r['params_bytes'] / 1024:>11.1f}"
+            f"{r['raw_bytes'] / max(r['params_bytes'], 1):>7.1f}x"
+            f"{r['encode_lines_per_s']:>12,.0f}{r['decode_lines_per_s']:>12,.0f}"
+        )
+        if conn is not None:
+            sizes = await measure_table_sizes(conn, rows)
+            line += f"{sizes['full'] / 1024:>10.0f}KB{sizes['params'] / 1024:>12.0f}KB"
+        print(line)
+        if r["raw_fallback"]:
+            print(f"   ({r['raw_fallback']} lines kept as raw_content)")
+
+    if conn is not None:
+        print(f"\nTable sizes are for {REPEAT} copies of each dataset.")
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the ingest, parsing and detection hot paths.
+
+Sections (all run by default, pick some with --only a,b):
+- ingest:    POST /ingest on a running ingest service (start it first with
+             uvicorn main:app, on a local Postgres or a stand-in database).
+             For each batch size in INGEST_BATCH_SIZES: lines/s and p50/p99
+             request latency, one keep-alive connection. With write-behind
+             on, this is the rate requests are accepted (202), not committed.
+             The rows are really written, so don't point it at a database you
+             care about.
+- detection: cost of one Detector.observe tick as the baseline history and
+             the number of templates per window grow, of scoring every
+             template's rate (Detector.check_template_counts), and the
+             lookup cost and measured vs estimated false-positive rate of the
+             bounded known-template store (template_store.KnownTemplates) as
+             it fills past its expected size.
+- parser:    lines/s of drain.mask, DrainParser and DrainTree on
+             agent/benchmark/*_2k.log (eval_drain.py's parsers).
+- demo:      lines/s and MB/s of the demo log generators
+             (generate_dataset.py, generate_demos.py, generate_demo_scenarios.py),
+             run in a temporary directory.
+
+Results go to a JSON file (default bench-<git commit>.json) together with
+the commit, Python version and CPU count. --compare <older result file>
+prints how each metric moved against it.
+
+Usage:
+    python bench_suite.py [--only ingest,detection,parser,demo] [--url URL]
+                          [--out FILE] [--compare FILE]
+"""
+
+import argparse
+import contextlib
+import http.client
+import importlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse
+
+from baselines import StreamBaselines
+from detector import Detector
+from drain import mask
+from template_store import KnownTemplates
+from eval_drain import DEFAULT_FILES, PARSERS, lines_per_second, new_parser
+
+# --- CONFIGURATION ---
+INGEST_URL = "http://localhost:8000"
+INGEST_BATCH_SIZES = [1, 50, 500, 5000]
+INGEST_LINES_PER_BATCH_SIZE = 20_000  # lines sent per batch size
+INGEST_MIN_REQUESTS = 20
+
+DETECTION_HISTORY_SIZES = [10, 100, 1000, 10_000]
+DETECTION_TEMPLATE_COUNTS = [10, 1000, 20_000]  # distinct templates per window (20k > the known-template LRU)
+DETECTION_TICKS = 200
+KNOWN_TEMPLATE_COUNTS = [10_000, 200_000, 1_000_000]  # default store expects 200k
+KNOWN_TEMPLATE_BATCH = 1000  # templates per add_all() call, like one ingest batch
+KNOWN_TEMPLATE_PROBES = 100_000  # never-seen templates tried per case
+
+DEMO_GENERATORS = ["generate_dataset", "generate_demos", "generate_demo_scenarios"]
+DEMO_REPEATS = 3
+
+SECTIONS = ["ingest", "detection", "parser", "demo"]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def bench_ingest(url):
+    lines = []
+    for path in DEFAULT_FILES:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            lines += [line.rstrip("\n").replace("\x00", "") for line in f if line.strip()]
+    items = [{"content": line, "template": mask(line)} for line in lines]
+
+    target = urlparse(url)
+    conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+    headers = {"Content-Type": "application/json"}
+    try:
+        conn.request("GET", "/")
+        conn.getresponse().read()
+    except OSError as e:
+        return {"skipped": f"ingest service not reachable at {url} ({e})"}
+
+    results = {}
+    for batch_size in INGEST_BATCH_SIZES:
+        requests = max(INGEST_MIN_REQUESTS, INGEST_LINES_PER_BATCH_SIZE // batch_size)
+        bodies = []
+        for i in range(requests):
+            start = i * batch_size % len(items)
+            batch = (items[start:] + items)[:batch_size]
+            bodies.append(json.dumps(batch).encode())
+
+        latencies = []
+        rejected = 0
+        started = time.perf_counter()
+        for body in bodies:
+            sent = time.perf_counter()
+            conn.request("POST", "/ingest", body, headers)
+            response = conn.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - sent)
+            rejected += response.status >= 300  # 503/429 from admission control
+        elapsed = time.perf_counter() - started
+
+        results[str(batch_size)] = {
+            "requests": requests,
+            "lines_per_s": requests * batch_size / elapsed,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "rejected": rejected,
+        }
+    conn.close()
+    return results
+
+
+def bench_detection():
+    results = {}
+    for history in DETECTION_HISTORY_SIZES:
+        for template_count in DETECTION_TEMPLATE_COUNTS:
+            detector = Detector(window_size=history, sigma_multiplier=3, learning_windows=1)
+            templates = list(range(template_count))
+            counts = [random.randint(900, 1100) for _ in range(history + DETECTION_TICKS)]
+            # Fill the seen set and the baseline before timing
+            detector.observe(counts[0], templates)
+            for count in counts[1:history]:
+                detector.observe(count, [])
+
+            started = time.perf_counter()
+            for count in counts[history:]:
+                detector.observe(count, templates)
+            elapsed = time.perf_counter() - started
+            results[f"history={history},templates={template_count}"] = {
+                "us_per_tick": elapsed / DETECTION_TICKS * 1e6,
+            }
+
+    for template_count in DETECTION_TEMPLATE_COUNTS:
+        detector = Detector(learning_windows=1, template_baselines=StreamBaselines())
+        ids = list(range(template_count))
+        counts = [[random.randint(0, 50) for _ in ids] for _ in range(DETECTION_TICKS)]
+        detector.observe(1000, [])
+        for tick in counts[:DETECTION_TICKS // 2]:
+            detector.check_template_counts(ids, tick)
+
+        started = time.perf_counter()
+        for tick in counts:
+            detector.check_template_counts(ids, tick)
+        elapsed = time.perf_counter() - started
+        results[f"template_rates,templates={template_count}"] = {
+            "us_per_tick": elapsed / DETECTION_TICKS * 1e6,
+        }
+
+    for template_count in KNOWN_TEMPLATE_COUNTS:
+        store = KnownTemplates()
+        templates = [f"GET /home/user{i}/file <NUM>" for i in range(template_count)]
+        started = time.perf_counter()
+        for i in range(0, template_count, KNOWN_TEMPLATE_BATCH):
+            store.add_all(templates[i:i + KNOWN_TEMPLATE_BATCH])
+        insert = time.perf_counter() - started
+
+        hot = templates[-KNOWN_TEMPLATE_BATCH:]
+        started = time.perf_counter()
+        for _ in range(10):
+            store.add_all(hot)
+        hot_lookup = (time.perf_counter() - started) / (10 * len(hot))
+
+        estimated = store.false_positive_rate()
+        # One call checks all probes against the filter before storing any
+        probes = [f"POST /srv/tenant{i} <NUM>" for i in range(KNOWN_TEMPLATE_PROBES)]
+        false_positives = KNOWN_TEMPLATE_PROBES - len(store.add_all(probes))
+        results[f"known_templates,templates={template_count}"] = {
+            "us_per_insert": insert / template_count * 1e6,
+            "us_per_hot_lookup": hot_lookup * 1e6,
+            "memory_kb": store.memory_bytes / 1024,
+            "false_positive_rate": false_positives / KNOWN_TEMPLATE_PROBES,
+            "estimated_false_positive_rate": estimated,
+        }
+    return results
+
+
+def bench_parser():
+    results = {}
+    for path in DEFAULT_FILES:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            lines = [line.rstrip("\n") for line in f]
+        dataset = os.path.basename(path)
+        for name in PARSERS:
+            parse, _ = new_parser(name)
+            results[f"{dataset}/{name}"] = {
+                "lines_per_s": lines_per_second(name, lines),
+                "templates": len({parse(line)[1] for line in lines}),
+            }
+    return results
+
+
+def run_generator(module):
+    if hasattr(module, "generate_all"):
+        module.generate_all()
+    elif hasattr(module, "generate"):
+        module.generate()
+    else:
+        for name in sorted(dir(module)):
+            if name.startswith("generate_demo"):
+                getattr(module, name)()
+
+
+def bench_demo():
+    results = {}
+    cwd = os.getcwd()
+    for module_name in DEMO_GENERATORS:
+        best = float("inf")
+        for _ in range(DEMO_REPEATS):
+            with tempfile.TemporaryDirectory() as tmp:
+                # The generators write to relative paths, so run them in a
+                # scratch directory (generate_demos.py also creates demos/)
+                os.chdir(tmp)
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        module = importlib.import_module(module_name)
+                        os.makedirs(getattr(module, "DEMO_DIR", "."), exist_ok=True)
+                        started = time.perf_counter()
+                        run_generator(module)
+                        best = min(best, time.perf_counter() - started)
+                    written = lines = 0
+                    for root, _, files in os.walk(tmp):
+                        for name in files:
+                            with open(os.path.join(root, name), "rb") as f:
+                                data = f.read()
+                            written += len(data)
+                            lines += data.count(b"\n")
+                finally:
+                    os.chdir(cwd)
+        results[module_name] = {
+            "lines": lines,
+            "lines_per_s": lines / best,
+            "mb_per_s": written / 1e6 / best,
+        }
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def flatten(results):
+    """{"section/case/metric": value} for every number in a result file."""
+    flat = {}
+    for section, cases in results["sections"].items():
+        for case, metrics in cases.items():
+            if isinstance(metrics, dict):
+                for metric, value in metrics.items():
+                    flat[f"{section}/{case}/{metric}"] = value
+    return flat
+
+
+def compare(old, new):
+    print(f"\n📊 {new['commit']} vs {old['commit']}")
+    old_flat, new_flat = flatten(old), flatten(new)
+    for key, value in new_flat.items():
+        before = old_flat.get(key)
+        if not before or not isinstance(value, (int, float)):
+            continue
+        print(f"   {key:<60}{before:>14,.1f} -> {value:>14,.1f} ({(value - before) / before:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ingest, parsing and detection hot paths.")
+    parser.add_argument("--only", default=",".join(SECTIONS), help=f"comma-separated subset of {SECTIONS}")
+    parser.add_argument("--url", default=INGEST_URL, help="ingest service base URL")
+    parser.add_argument("--out", help="result file (default bench-<commit>.json)")
+    parser.add_argument("--compare", help="older result file to compare with")
+    args = parser.parse_args()
+
+    sections = [s.strip() for s in args.only.split(",") if s.strip()]
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        print(f"❌ Unknown sections: {', '.join(sorted(unknown))}")
+        sys.exit(1)
+
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "sections": {},
+    }
+    runners = {
+        "ingest": lambda: bench_ingest(args.url),
+        "detection": bench_detection,
+        "parser": bench_parser,
+        "demo": bench_demo,
+    }
+    print(f"⏱  Benchmark suite @ {commit}")
+    for section in sections:
+        started = time.perf_counter()
+        results["sections"][section] = result = runners[section]()
+        if "skipped" in result:
+            print(f"   {section:<10} ⚠️ skipped: {result['skipped']}")
+        else:
+            print(f"   {section:<10} done in {time.perf_counter() - started:.1f}s")
+        for case, metrics in result.items():
+            if isinstance(metrics, dict):
+                print("      " + f"{case:<40}" + "  ".join(
+                    f"{k} {v:,.1f}" if isinstance(v, float) else f"{k} {v}" for k, v in metrics.items()))
+
+    out = args.out or f"bench-{commit}.json"
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results written to {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
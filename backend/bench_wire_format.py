@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Compare the JSON /ingest payload with the packed batch format (wire_format.py).
+
+For each dataset it reports bytes on the wire and server-side decode time per
+line, at the agent's batch size and at a larger one. The JSON side mirrors
+what the Go agent sends today (json.Marshal escapes < and > as \\u003c/\\u003e)
+and what FastAPI does with it (json.loads + pydantic validation).
+
+Usage:
+    python bench_wire_format.py [log files...]   (default: agent/benchmark/*_2k.log)
+"""
+
+import glob
+import json
+import os
+import sys
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+
+from drain import mask
+from models import LogItem
+from wire_format import BatchDecoder, BatchEncoder
+
+DEFAULT_FILES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "..", "agent", "benchmark", "*_2k.log")))
+BATCH_SIZES = [50, 1000]
+REPEATS = 5
+
+def go_json(batch):
+    # encoding/json output: compact, HTML characters escaped
+    body = json.dumps(
+        [{"content": c, "template": t} for t, c in batch], separators=(",", ":"), ensure_ascii=False
+    )
+    body = body.replace("<", "\\u003c").replace(">", "\\u003e").replace("&", "\\u0026")
+    return body.encode()
+
+
+def packed(batch):
+    encoder = BatchEncoder()
+    for template, content in batch:
+        encoder.add(template, content)
+    return encoder.encode()
+
+
+def best_of(fn, payloads):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for payload in payloads:
+            fn(payload)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_file(path, batch_size, validator):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        lines = [line.rstrip("\n") for line in f if line.strip()]
+    rows = [(mask(line), line) for line in lines]
+    batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+
+    json_payloads = [go_json(b) for b in batches]
+    packed_payloads = [packed(b) for b in batches]
+
+    # Sanity check: the packed format must round-trip exactly
+    decoded = [r for p in packed_payloads for r in BatchDecoder().decode(p)]
+    assert decoded == [(t, c, "") for t, c in rows], f"{path}: packed batches did not round-trip"
+
+    json_time = best_of(lambda p: validator.validate_python(json.loads(p)), json_payloads)
+    packed_time = best_of(lambda p: BatchDecoder().decode(p), packed_payloads)
+
+    return {
+        "lines": len(rows),
+        "json_bytes": sum(map(len, json_payloads)),
+        "packed_bytes": sum(map(len, packed_payloads)),
+        "json_us_per_line": json_time / len(rows) * 1e6,
+        "packed_us_per_line": packed_time / len(rows) * 1e6,
+    }
+
+
+def main():
+    files = sys.argv[1:] or DEFAULT_FILES
+    validator = TypeAdapter(List[LogItem])
+
+    print("📦 Wire format benchmark: JSON (/ingest) vs packed (/ingest/packed)")
+    print(f"{'dataset':<32}{'batch':>6}{'JSON KB':>10}{'packed KB':>11}{'ratio':>7}"
+          f"{'JSON us/line':>14}{'packed us/line':>16}{'speedup':>9}")
+    for path in files:
+        name = os.path.basename(path)
+        for batch_size in BATCH_SIZES:
+            r = bench_file(path, batch_size, validator)
+            print(
+                f"{name:<32}{batch_size:>6}"
+                f"{r['json_bytes'] / 1024:>10.1f}{r['packed_bytes'] / 1024:>11.1f}"
+                f"{r['json_bytes'] / r['packed_bytes']:>6.2f}x"
+                f"{r['json_us_per_line']:>14.2f}{r['packed_us_per_line']:>16.2f}"
+                f"{r['json_us_per_line'] / r['packed_us_per_line']:>8.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Bulk import of a log file straight into Postgres, without the agent.
+
+The file is memory-mapped and cut into chunks of about CHUNK_MB that end on a
+line boundary. Worker processes template the chunks (drain.mask, the agent's
+rules) and the main process writes each result with binary COPY through
+storage.write_logs, on up to WRITERS connections at once.
+
+Progress is saved to <file>.import-state after every chunk: the byte offset
+up to which every chunk has been written. Run the same command again to
+resume from there (--restart starts over). A crash between a chunk's write
+and the state save re-imports that one chunk.
+
+Imported rows get the import time as received_at and stay out of
+log_rollups, so a backfill isn't mistaken for a traffic spike by the
+analyzers. --source names the host or service the file came from (stored
+like the ingest service's LogItem.source).
+
+Usage:
+    python bulk_import.py <log file> [--workers N] [--chunk-mb M] [--source NAME] [--restart]
+"""
+
+import argparse
+import asyncio
+import json
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import asyncpg
+
+from drain import mask
+from settings import DB_CONFIG, TEMPLATE_CACHE_SIZE
+from storage import write_logs
+from template_dictionary import SourceDictionary, TemplateDictionary
+
+# --- CONFIGURATION ---
+CHUNK_MB = 8
+WRITERS = 4  # concurrent COPY connections
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+
+def chunk_ranges(path, start, chunk_bytes):
+    """(start, end) byte ranges from `start` to EOF, each ending after a newline."""
+    size = os.path.getsize(path)
+    if start >= size:
+        return []
+    ranges = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        while start < size:
+            newline = mm.find(b"\n", min(start + chunk_bytes, size) - 1)
+            end = size if newline == -1 else newline + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def template_chunk(path, start, end, source):
+    """Worker: (template, content, source) rows for the lines in [start, end)."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        text = mm[start:end].decode("utf-8", errors="replace")
+    rows = []
+    for line in text.split("\n"):
+        line = line.rstrip("\r")
+        if not line.strip():
+            continue
+        line = line.replace("\x00", "")  # Postgres text can't hold NUL bytes
+        rows.append((mask(line), line, source))
+    return rows
+
+
+def state_path(path):
+    return path + ".import-state"
+
+
+def load_offset(path, size):
+    try:
+        with open(state_path(path)) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return 0
+    if state.get("size") != size:
+        print(f"⚠️ {path} changed size since the last import; starting over")
+        return 0
+    return state["offset"]
+
+
+def save_offset(path, size, offset, rows):
+    tmp = state_path(path) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"size": size, "offset": offset, "rows": rows}, f)
+    os.replace(tmp, state_path(path))
+
+
+async def run_import(path, workers, chunk_bytes, restart, source=""):
+    size = os.path.getsize(path)
+    offset = 0 if restart else load_offset(path, size)
+    ranges = chunk_ranges(path, offset, chunk_bytes)
+    if not ranges:
+        print(f"✅ {path} is already fully imported")
+        return
+    if offset:
+        print(f"↩️  Resuming at byte {offset:,} of {size:,}")
+    print(f"📥 Importing {path}: {(size - offset) / 1e6:,.1f} MB in {len(ranges)} chunks, "
+          f"{workers} workers, {WRITERS} writers")
+
+    db_pool = await asyncpg.create_pool(min_size=1, max_size=WRITERS, **DB_CONFIG)
+    templates = TemplateDictionary(TEMPLATE_CACHE_SIZE)
+    sources = SourceDictionary(1)
+    loop = asyncio.get_running_loop()
+    # Bounds how many templated chunks wait in memory for a writer
+    slots = asyncio.Semaphore(workers + WRITERS)
+    written = {}  # start -> end of chunks written beyond the committed offset
+    committed = offset
+    rows_written = 0
+    started = time.perf_counter()
+
+    async def import_chunk(executor, start, end):
+        nonlocal committed, rows_written
+        async with slots:
+            rows = await loop.run_in_executor(executor, template_chunk, path, start, end, source)
+            async with db_pool.acquire() as conn:
+                await write_logs(conn, rows, templates, rollups=False, sources=sources)
+        rows_written += len(rows)
+        written[start] = end
+        # Only a contiguous prefix of written chunks counts as done
+        while committed in written:
+            committed = written.pop(committed)
+        save_offset(path, size, committed, rows_written)
+        elapsed = time.perf_counter() - started
+        print(f"\r   {committed / size:6.1%} | {rows_written:,} rows | "
+              f"{rows_written / elapsed:,.0f} rows/s | {(committed - offset) / 1e6 / elapsed:,.1f} MB/s",
+              end="", flush=True)
+
+    try:
+        with ProcessPoolExecutor(workers) as executor:
+            await asyncio.gather(*(import_chunk(executor, start, end) for start, end in ranges))
+    finally:
+        await db_pool.close()
+    elapsed = time.perf_counter() - started
+    print(f"\n✅ Imported {rows_written:,} rows in {elapsed:.1f}s "
+          f"({rows_written / elapsed:,.0f} rows/s, {templates.stats()['cached_templates']} templates)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-import a log file into the logs table.")
+    parser.add_argument("path")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="templating processes")
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_MB, help="approximate chunk size")
+    parser.add_argument("--source", default="", help="host or service the logs came from")
+    parser.add_argument("--restart", action="store_true", help="ignore saved progress")
+    args = parser.parse_args()
+    chunk_bytes = int(args.chunk_mb * 1024 * 1024)
+    if chunk_bytes < 1:
+        # chunk_ranges would find the previous chunk's newline forever
+        parser.error("--chunk-mb must be positive")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    if not os.path.isfile(args.path):
+        print(f"❌ No such file: {args.path}")
+        sys.exit(1)
+    asyncio.run(run_import(args.path, args.workers, chunk_bytes, args.restart, args.source))
+
+
+if __name__ == "__main__":
+    main()
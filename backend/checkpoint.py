@@ -0,0 +1,44 @@
+"""
+Checkpoints of a Detector's learned state, so that a restarted analyzer
+resumes detection right away instead of relearning its baseline. (Known
+templates need no checkpoint: the database keeps them, see
+known_templates.learned_at.)
+
+A checkpoint is one uncompressed .npz file: the arrays of Detector.state()
+plus the time it was saved. It is written to a temporary file and renamed
+over the previous one, so a crash mid-write leaves the last good checkpoint.
+Loading is a handful of array reads, a few milliseconds even with 100k
+templates.
+"""
+
+import os
+import time
+
+import numpy as np
+
+
+def save(path, detector):
+    """Write the detector's state to `path`. Returns the file size in bytes."""
+    tmp = path + ".tmp"
+    # An open file, so np.savez doesn't append ".npz" to the temporary name
+    with open(tmp, "wb") as f:
+        np.savez(f, saved_at=np.array(time.time()), **detector.state())
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+def load(path, detector, max_age=None):
+    """Restore the detector from `path`. Returns the checkpoint's age in
+    seconds, or None (detector untouched) if there is no checkpoint or it is
+    older than max_age seconds. Raises ValueError if it doesn't fit the
+    detector's configuration."""
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            state = dict(data)
+    except FileNotFoundError:
+        return None
+    age = time.time() - float(state.pop("saved_at"))
+    if max_age is not None and age > max_age:
+        return None
+    detector.load_state(state)
+    return age
@@ -0,0 +1,179 @@
+"""
+Frequency and pattern anomaly detection, shared by the polling analyzer
+(analyzer_enhanced.py) and the ingest service's embedded mode
+(EMBEDDED_DETECTION in main.py, see embedded_detector.py).
+
+- Frequency: a window's log count is compared with mean + SIGMA * std of the
+  normal windows, as estimated by a baseline engine (baselines.py; by
+  default the last WINDOW_SIZE windows). Spikes are kept out of the baseline.
+- Template rate (optional): each template's count in the window is compared
+  with its own baseline (baselines.StreamBaselines), so a burst or drop of
+  one template shows up even when the total stays within its band.
+- Source rate (optional): the same for each source's total (host, service),
+  so one noisy host can't hide another one's outage.
+- Pattern: every template seen while learning the baseline is "normal";
+  after that, each template seen for the first time is reported once. The
+  templates seen are kept as hashes in a memory-bounded store
+  (template_store.KnownTemplates), at the cost of a small false-positive
+  rate: a new template may, rarely, pass as known.
+
+Templates can be any key with a stable str() (template IDs or template text,
+as the embedded mode uses).
+"""
+
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from baselines import WindowBaseline, engine_state, load_engine_state
+from template_store import KnownTemplates
+
+# kind is "frequency", "template" (rate of one template), "source" (rate of
+# one source) or "pattern"; threshold is set for all but pattern anomalies,
+# template for template and pattern anomalies and holds the source's ID for
+# source anomalies
+Anomaly = namedtuple("Anomaly", "kind log_count deviation_score threshold template")
+
+
+def shorten(tpl):
+    return tpl if len(tpl) <= 180 else tpl[:177] + "..."
+
+
+def describe(anomaly, template_text=None):
+    """anomalies.description for an Anomaly (template_text overrides the key,
+    e.g. with the template's text or the source's name)."""
+    if anomaly.kind == "frequency":
+        return f"[FREQUENCY] Spike: {anomaly.log_count} logs/s (Threshold: {int(anomaly.threshold)})"
+    tpl = template_text if template_text is not None else str(anomaly.template)
+    if anomaly.kind in ("template", "source"):
+        change = "Burst" if anomaly.deviation_score > 0 else "Drop"
+        subject = "for" if anomaly.kind == "template" else "from"
+        return (f"[{anomaly.kind.upper()}] {change}: {anomaly.log_count} logs/window "
+                f"(Threshold: {int(anomaly.threshold)}) {subject} {shorten(tpl)}")
+    return f"[PATTERN] New template: {shorten(tpl)}"
+
+
+class Detector:
+    def __init__(self, window_size=10, sigma_multiplier=3, learning_windows=5, baseline=None,
+                 template_baselines=None, source_baselines=None, known_templates=None):
+        # baseline: an engine from baselines.py; defaults to the last window_size windows
+        self.engine = baseline if baseline is not None else WindowBaseline(window_size)
+        # template_baselines / source_baselines: baselines.StreamBaselines,
+        # or None for no per-template / per-source rate detection (they need
+        # integer ids)
+        self.template_baselines = template_baselines
+        self.source_baselines = source_baselines
+        self.sigma_multiplier = sigma_multiplier
+        self.learning_windows = learning_windows
+        self.learned_windows = 0
+        # known_templates: a template_store.KnownTemplates, sized by the
+        # caller; the default one is only allocated once pattern detection
+        # is used (the polling analyzer doesn't, see NEW_TEMPLATES_QUERY)
+        self._seen_templates = known_templates
+        self.learning = True
+
+    @property
+    def seen_templates(self):
+        if self._seen_templates is None:
+            self._seen_templates = KnownTemplates()
+        return self._seen_templates
+
+    def baseline(self, at=None):
+        """(mean, effective std, threshold) for a window at time `at` (now by
+        default; only seasonal engines care)."""
+        mean, std = self.engine.estimate(time.time() if at is None else at)
+        mean = float(mean)
+        effective_std = max(float(std), 1.0, mean * 0.05)
+        return mean, effective_std, mean + self.sigma_multiplier * effective_std
+
+    def check_count(self, count, at=None):
+        """Frequency anomaly for a window holding `count` logs (so far), or None."""
+        at = time.time() if at is None else at
+        if self.learning or not self.engine.ready(at):
+            return None
+        mean, effective_std, threshold = self.baseline(at)
+        if count <= threshold:
+            return None
+        return Anomaly("frequency", count, (count - mean) / effective_std, threshold, None)
+
+    def check_templates(self, templates):
+        """Pattern anomalies for templates not seen before; all of them are
+        remembered. While learning, new templates are simply normal."""
+        new = self.seen_templates.add_all([t for t in templates if t is not None])
+        if self.learning:
+            return []
+        return [Anomaly("pattern", 0, 0.0, None, t) for t in new]
+
+    def check_template_counts(self, ids, counts, at=None):
+        """Template anomalies for a finished window with counts[i] logs of
+        template ids[i], most deviant first. Every template's baseline is
+        updated; nothing is reported while learning."""
+        return self._check_streams("template", self.template_baselines, ids, counts, at)
+
+    def check_source_counts(self, ids, counts, at=None):
+        """Source anomalies for a finished window with counts[i] logs from
+        source ids[i], like check_template_counts."""
+        return self._check_streams("source", self.source_baselines, ids, counts, at)
+
+    def _check_streams(self, kind, baselines, ids, counts, at):
+        flagged = baselines.observe(ids, counts, at)
+        if self.learning:
+            return []
+        return [Anomaly(kind, int(count), float(score), float(threshold), int(stream_id))
+                for stream_id, count, _, _, threshold, score in zip(*flagged)]
+
+    def state(self):
+        """Everything the detector has learned, as arrays (see checkpoint.py).
+        The known templates are left out: the analyzer, the one user of
+        checkpoints, tracks them in the database (known_templates.learned_at)."""
+        state = {
+            "learning": np.array(self.learning),
+            "learned_windows": np.array(self.learned_windows),
+            **engine_state(self.engine, "baseline."),
+        }
+        if self.template_baselines is not None:
+            state.update(engine_state(self.template_baselines, "templates."))
+        if self.source_baselines is not None:
+            state.update(engine_state(self.source_baselines, "sources."))
+        return state
+
+    def load_state(self, state):
+        """Restore a state() of a detector with the same configuration. Rate
+        baselines missing from the state start empty."""
+        load_engine_state(self.engine, state, "baseline.")
+        for prefix, baselines in (("templates.", self.template_baselines), ("sources.", self.source_baselines)):
+            if baselines is not None and prefix + "engine" in state:
+                load_engine_state(baselines, state, prefix)
+        self.learning = bool(state["learning"])
+        self.learned_windows = int(state["learned_windows"])
+
+    def close_window(self, count, spiked=False, at=None):
+        """Add a finished window (that started at `at`, default now) to the
+        baseline, unless it was a spike. Returns True when this window
+        completes the learning phase."""
+        at = time.time() if at is None else at
+        if self.learning:
+            if count == 0:
+                return False  # no traffic yet; empty windows don't count
+            self.engine.update(count, at)
+            self.learned_windows += 1
+            if self.learned_windows >= self.learning_windows:
+                self.learning = False
+                return True
+            return False
+        if not spiked:
+            self.engine.update(count, at)
+        return False
+
+    def observe(self, count, templates, at=None):
+        """Evaluate one complete window (started at `at`, default now).
+        Returns its anomalies."""
+        if self.learning:
+            self.check_templates(templates)
+            self.close_window(count, at=at)
+            return []
+        spike = self.check_count(count, at)
+        self.close_window(count, spiked=spike is not None, at=at)
+        anomalies = self.check_templates(templates)
+        return [spike] + anomalies if spike else anomalies
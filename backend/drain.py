@@ -0,0 +1,158 @@
+"""
+Server-side log templating, matching Drain.Parse in agent/parser/drain.go.
+
+1. Masking: IPv4 addresses -> <IP>, then 0x... hex values -> <HEX>, then any
+   remaining digit run -> <NUM>. The masked line is the template.
+2. Clustering: lines whose templates share token count + first 4 tokens
+   (the signature) get the same event ID (E1, E2, ...).
+
+Masking runs the three precompiled regexes in drain.go's order; the IP and
+hex passes are skipped when the line can't contain a match ("." / "0x"), so
+most lines cost a single C-level substitution. Go's \\d only matches ASCII
+digits, hence re.ASCII.
+"""
+
+import re
+from collections import OrderedDict
+
+RE_IP = re.compile(r"\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}", re.ASCII)
+RE_HEX = re.compile(r"0x[0-9a-fA-F]+", re.ASCII)
+RE_NUM = re.compile(r"\d+", re.ASCII)
+
+SIGNATURE_TOKENS = 4
+
+
+def mask(line):
+    """The template of a line: IPs, hex values and numbers masked."""
+    if "." in line:
+        line = RE_IP.sub("<IP>", line)
+    if "0x" in line:
+        line = RE_HEX.sub("<HEX>", line)
+    return RE_NUM.sub("<NUM>", line)
+
+
+def signature(template):
+    tokens = template.split()
+    return f"{len(tokens)} {' '.join(tokens[:SIGNATURE_TOKENS])}"
+
+
+class DrainParser:
+    """Assigns event IDs by signature, keeping at most `capacity` signatures
+    (least recently used ones are forgotten and get a new ID if seen again)."""
+
+    def __init__(self, capacity=100_000):
+        self.capacity = capacity
+        self._events = OrderedDict()
+        self.counter = 0
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, line):
+        """Returns (event_id, template); ("", "") for a blank line."""
+        template = mask(line)
+        if not template.strip():
+            return "", ""
+        sig = signature(template)
+        event_id = self._events.get(sig)
+        if event_id is not None:
+            self._events.move_to_end(sig)
+            self.hits += 1
+            return event_id, template
+
+        self.misses += 1
+        self.counter += 1
+        event_id = f"E{self.counter}"
+        self._events[sig] = event_id
+        if len(self._events) > self.capacity:
+            self._events.popitem(last=False)
+        return event_id, template
+
+    def stats(self):
+        return {
+            "signatures": len(self._events),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+WILDCARD = "<*>"
+
+
+class DrainTree:
+    """
+    Fixed-depth Drain parse tree (He et al., ICWS 2017).
+
+    Masked lines are routed by token count, then by their first depth - 2
+    tokens, to a leaf holding a list of clusters. A line joins the leaf's
+    most similar cluster (share of positions with the same token) if that
+    similarity is at least `similarity`; positions where they differ become
+    <*> in the cluster's template, in place. Otherwise it starts a new
+    cluster. Each inner node has at most `max_children` children; further
+    tokens share a <*> child.
+
+    parse() returns (cluster_id, template) like DrainParser.parse(). A
+    cluster keeps its ID while its template is generalized, so the template
+    text returned for a cluster can change (e.g. "open file a.txt" ->
+    "open file <*>").
+    """
+
+    def __init__(self, depth=4, similarity=0.4, max_children=100):
+        if depth < 3:
+            raise ValueError("depth must be at least 3 (root, length, one token level)")
+        self.depth = depth
+        self.similarity = similarity
+        self.max_children = max_children
+        self._root = {}
+        self.clusters = []  # cluster ID n is E{n + 1}; each one is a token list
+
+    def parse(self, line):
+        """Returns (cluster_id, template); ("", "") for a blank line."""
+        tokens = mask(line).split()
+        if not tokens:
+            return "", ""
+        leaf = self._leaf(tokens)
+
+        best, best_sim, best_params = None, -1.0, -1
+        for index in leaf:
+            template = self.clusters[index]
+            same = params = 0
+            for a, b in zip(template, tokens):
+                if a == WILDCARD:
+                    params += 1
+                elif a == b:
+                    same += 1
+            sim = same / len(tokens)
+            if sim > best_sim or (sim == best_sim and params > best_params):
+                best, best_sim, best_params = index, sim, params
+
+        if best is not None and best_sim >= self.similarity:
+            template = self.clusters[best]
+            for i, (a, b) in enumerate(zip(template, tokens)):
+                if a != b and a != WILDCARD:
+                    template[i] = WILDCARD
+        else:
+            best = len(self.clusters)
+            template = tokens
+            self.clusters.append(template)
+            leaf.append(best)
+        return f"E{best + 1}", " ".join(template)
+
+    def _leaf(self, tokens):
+        node = self._root.setdefault(len(tokens), {})
+        levels = min(self.depth - 2, len(tokens))
+        for level in range(levels):
+            token = tokens[level]
+            child = node.get(token)
+            if child is None:
+                # One of the max_children slots is kept for the <*> child
+                if len(node) >= self.max_children - 1:
+                    token = WILDCARD
+                    child = node.get(token)
+                if child is None:
+                    child = node[token] = [] if level == levels - 1 else {}
+            node = child
+        return node
+
+    def stats(self):
+        return {"clusters": len(self.clusters), "depth": self.depth, "similarity": self.similarity}
@@ -0,0 +1,119 @@
+"""
+In-process anomaly detection for the ingest service (EMBEDDED_DETECTION in
+main.py).
+
+Accepted batches are pushed into in-memory counters for the current window
+as they arrive, so anomalies are raised on the batch that causes them rather
+than on the next poll of the database:
+- a new template is reported on the first batch that carries it
+- a spike is reported as soon as the window's running count crosses the
+  threshold (once per window)
+Every window_seconds the window is closed and added to the baseline. The DB
+only sees the anomaly inserts, done by a separate writer coroutine.
+"""
+
+import asyncio
+import time
+
+from detector import describe
+
+INSERT_ANOMALY_QUERY = """
+    INSERT INTO anomalies (log_count, description, deviation_score)
+    VALUES ($1, $2, $3)
+"""
+
+
+class EmbeddedDetector:
+    def __init__(self, detector, window_seconds, write):
+        """write: async fn(records) inserting (log_count, description, score) rows."""
+        self.detector = detector
+        self.window_seconds = window_seconds
+        self._write = write
+        self._count = 0
+        self._spiked = False
+        self._window_start = time.monotonic()
+        self._pending = []
+        self._wakeup = asyncio.Event()
+        self.windows = 0
+        self.detected = 0
+        self.written = 0
+        self.write_errors = 0
+        self._detected_at = None  # when the oldest unwritten anomaly was detected
+        self.last_write_latency = None  # detection -> anomaly row committed, seconds
+
+    def feed(self, rows):
+        """Count a batch of accepted (template, content, source) rows."""
+        self._count += len(rows)
+        detector = self.detector
+        anomalies = detector.check_templates({row[0] for row in rows})
+        if not self._spiked:
+            spike = detector.check_count(self._count)
+            if spike is not None:
+                self._spiked = True
+                anomalies.append(spike)
+        if anomalies:
+            self._report(anomalies)
+
+    def _report(self, anomalies):
+        now = time.monotonic()
+        if self._detected_at is None:
+            self._detected_at = now
+        for anomaly in anomalies:
+            description = describe(anomaly)
+            if anomaly.kind == "frequency":
+                print(f"🚨 FREQUENCY ANOMALY: {self._count} logs {now - self._window_start:.2f}s into the window "
+                      f"(threshold {int(anomaly.threshold)}/window, {anomaly.deviation_score:.2f}x sigma)")
+            else:
+                print(f"🧩 {description}")
+            self._pending.append((anomaly.log_count, description, float(anomaly.deviation_score)))
+        self.detected += len(anomalies)
+        self._wakeup.set()
+
+    def close_window(self):
+        count, spiked = self._count, self._spiked
+        self._count = 0
+        self._spiked = False
+        self._window_start = time.monotonic()
+        self.windows += 1
+        if self.detector.close_window(count, spiked):
+            mean, _, threshold = self.detector.baseline()
+            print(f"✅ Detection baseline established: mean {int(mean)} logs/window, "
+                  f"threshold {int(threshold)}, {len(self.detector.seen_templates)} known templates")
+
+    async def run(self):
+        await asyncio.gather(self._window_loop(), self._write_loop())
+
+    async def _window_loop(self):
+        while True:
+            await asyncio.sleep(self._window_start + self.window_seconds - time.monotonic())
+            self.close_window()
+
+    async def _write_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            records, self._pending = self._pending, []
+            detected_at, self._detected_at = self._detected_at, None
+            try:
+                await self._write(records)
+                self.written += len(records)
+                self.last_write_latency = time.monotonic() - detected_at
+            except Exception as e:
+                self.write_errors += len(records)
+                print(f"⚠️ ANOMALY WRITE ERROR: {e}")
+
+    def stats(self):
+        detector = self.detector
+        stats = {
+            "learning": detector.learning,
+            "windows": self.windows,
+            "current_window_count": self._count,
+            "known_templates": detector.seen_templates.stats(),
+            "anomalies_detected": self.detected,
+            "anomalies_written": self.written,
+            "anomaly_write_errors": self.write_errors,
+            "last_write_latency_ms": None if self.last_write_latency is None else round(self.last_write_latency * 1000, 1),
+        }
+        if not detector.learning:
+            stats["baseline_mean"], _, stats["threshold"] = detector.baseline()
+        return stats
@@ -28,14 +28,14 @@ def main():
 
     print("📊 LogIQ Evaluation Summary")
 
-    # 1) Basic log stats
+    # 1) Basic log stats, from the per-second rollups (second resolution)
     cur.execute(
         """
         SELECT
-          COUNT(*) AS total,
-          MIN(received_at) AS first_ts,
-          MAX(received_at) AS last_ts
-        FROM logs
+          COALESCE(SUM(count), 0) AS total,
+          MIN(bucket) AS first_ts,
+          MAX(bucket) + INTERVAL '1 second' AS last_ts
+        FROM log_rollups
         """
     )
     total, first_ts, last_ts = cur.fetchone()
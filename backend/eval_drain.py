@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Accuracy and speed of the log parsers in drain.py on the loghub datasets.
+
+Parsers:
+- mask:      what the agent sends today; the masked line is the template
+- signature: the agent's event IDs (token count + first 4 tokens)
+- tree:      DrainTree, the fixed-depth parse tree
+
+For every dataset (agent/benchmark/*_2k.log) it reports lines/s and how many
+distinct template strings each parser emits over the whole lines, which is
+what known_templates and the analyzers' seen-template set grow by. Datasets
+with a loghub ground truth file next to them (<name>_structured.csv) also
+get, computed on its Content column:
+- grouping accuracy: share of lines whose predicted group holds exactly the
+  same lines as their ground-truth event (loghub's parsing accuracy)
+- template accuracy: share of lines whose template matches the ground-truth
+  template once every variable (<*>, <IP>, <HEX>, <NUM>) is written the same.
+  The tree generalizes whole tokens, so e.g. "blk_<NUM>" and "blk_-<NUM>"
+  become "<*>" where loghub has "blk_<*>"; that counts as a miss here.
+
+Usage:
+    python eval_drain.py [log files...]   (default: agent/benchmark/*_2k.log)
+"""
+
+import csv
+import glob
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+
+from drain import DrainParser, DrainTree, mask
+
+DEFAULT_FILES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "..", "agent", "benchmark", "*_2k.log")))
+REPEATS = 3
+
+# Settings from the Drain paper's loghub benchmark
+TREE_DEPTH = 4
+TREE_SIMILARITY = 0.5
+TREE_MAX_CHILDREN = 100
+
+PARSERS = ("mask", "signature", "tree")
+VARIABLE_RE = re.compile(r"<\*>|<IP>|<HEX>|<NUM>")
+
+
+def new_parser(name):
+    """A fresh parser: (parse, final) where parse(line) -> (group, template)
+    and final(group, template) is the template the line ends up with."""
+    if name == "mask":
+        def parse(line):
+            template = mask(line)
+            return template, template
+        return parse, lambda group, template: template
+    if name == "signature":
+        return DrainParser().parse, lambda group, template: template
+    tree = DrainTree(TREE_DEPTH, TREE_SIMILARITY, TREE_MAX_CHILDREN)
+    # Scored as the cluster's template ends up, after all generalization
+    return tree.parse, lambda group, template: " ".join(tree.clusters[int(group[1:]) - 1]) if group else ""
+
+
+def lines_per_second(name, lines):
+    best = float("inf")
+    for _ in range(REPEATS):
+        parse, _ = new_parser(name)
+        start = time.perf_counter()
+        for line in lines:
+            parse(line)
+        best = min(best, time.perf_counter() - start)
+    return len(lines) / best
+
+
+def load_ground_truth(log_path):
+    path = log_path + "_structured.csv"
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    return [r["Content"] for r in rows], [r["EventId"] for r in rows], [r["EventTemplate"] for r in rows]
+
+
+def normalize(template):
+    return " ".join(VARIABLE_RE.sub("<*>", template).split())
+
+
+def grouping_accuracy(predicted, truth):
+    truth_groups = defaultdict(set)
+    for i, event in enumerate(truth):
+        truth_groups[event].add(i)
+    predicted_groups = defaultdict(set)
+    for i, group in enumerate(predicted):
+        predicted_groups[group].add(i)
+    correct = sum(
+        len(members) for members in predicted_groups.values()
+        if truth_groups[truth[next(iter(members))]] == members
+    )
+    return correct / len(truth)
+
+
+def main():
+    files = sys.argv[1:] or DEFAULT_FILES
+
+    print("🌳 Drain parsers: accuracy and speed")
+    print(f"   tree: depth {TREE_DEPTH}, similarity {TREE_SIMILARITY}, max children {TREE_MAX_CHILDREN}\n")
+    print(f"{'dataset':<18}{'parser':<11}{'lines/s':>10}{'templates':>11}{'grouping acc':>14}{'template acc':>14}")
+    for path in files:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            lines = [line.rstrip("\n") for line in f]
+        truth = load_ground_truth(path)
+
+        for name in PARSERS:
+            speed = lines_per_second(name, lines)
+            parse, _ = new_parser(name)
+            templates = len({parse(line)[1] for line in lines})
+            group_acc = template_acc = "n/a"
+            if truth is not None:
+                contents, events, gt_templates = truth
+                parse, final = new_parser(name)
+                result = [parse(content) for content in contents]
+                group_acc = f"{grouping_accuracy([group for group, _ in result], events):.3f}"
+                matched = sum(normalize(final(*r)) == normalize(gt) for r, gt in zip(result, gt_templates))
+                template_acc = f"{matched / len(contents):.3f}"
+            print(f"{os.path.basename(path):<18}{name:<11}{speed:>10,.0f}{templates:>11}{group_acc:>14}{template_acc:>14}")
+
+    print("\n(accuracy needs <dataset>_structured.csv from loghub next to the log file)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Write-behind buffer for the ingest service.
+
+Requests hand their rows to IngestBuffer.offer() and return immediately. A
+single background flusher (IngestBuffer.run) coalesces everything queued into
+one large write whenever flush_rows rows are pending or flush_interval seconds
+have passed, whichever comes first.
+"""
+
+import asyncio
+import itertools
+import time
+from collections import deque
+
+
+class IngestBuffer:
+    def __init__(self, write, flush_rows, flush_interval, max_rows, retry_errors=()):
+        # write: async callable taking (iterable of rows, row count)
+        # retry_errors: exceptions after which a failed batch is re-queued
+        #               (e.g. DB down) instead of dropped
+        self._write = write
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self._retry_errors = retry_errors
+
+        # Each request's rows stay one chunk; flushes chain chunks together, so
+        # queuing and flushing never touch individual rows.
+        self._chunks = deque()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self.depth = 0
+
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.dropped_rows = 0
+        self.failed_flushes = 0
+        self.last_flush_rows = 0
+        self.last_flush_seconds = 0.0
+
+    def offer(self, rows):
+        """Queue a list of rows. Returns False (queues nothing) if it would overflow."""
+        if self.depth + len(rows) > self.max_rows:
+            return False
+        self._chunks.append(rows)
+        self.depth += len(rows)
+        if self.depth >= self.flush_rows:
+            self._wakeup.set()
+        return True
+
+    async def run(self):
+        """Flusher loop; run as a background task. Returns after stop()."""
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # Keep flushing while a full batch is waiting (e.g. after a burst)
+            while await self.flush() >= self.flush_rows:
+                pass
+
+    async def flush(self):
+        """Write up to flush_rows queued rows as one batch. Returns rows written."""
+        batch = []
+        size = 0
+        while self._chunks and size < self.flush_rows:
+            chunk = self._chunks.popleft()
+            batch.append(chunk)
+            size += len(chunk)
+        if not batch:
+            return 0
+        self.depth -= size
+
+        start = time.perf_counter()
+        try:
+            await self._write(itertools.chain.from_iterable(batch), size)
+        except self._retry_errors as e:
+            self.failed_flushes += 1
+            print(f"⚠️ FLUSH FAILED, re-queuing {size} rows: {e}")
+            self._requeue(batch, size)
+            return 0
+        except Exception as e:
+            self.failed_flushes += 1
+            print(f"⚠️ FLUSH FAILED, dropping {size} rows: {e}")
+            self.dropped_rows += size
+            return 0
+
+        self.flushes += 1
+        self.flushed_rows += size
+        self.last_flush_rows = size
+        self.last_flush_seconds = time.perf_counter() - start
+        return size
+
+    def stop(self):
+        """Make run() return once its current flush is done (rather than
+        cancelling it mid-write, which would lose the rows being written)."""
+        self._stopping = True
+        self._wakeup.set()
+
+    async def drain(self):
+        """Flush everything still queued (used at shutdown)."""
+        while self.depth and await self.flush():
+            pass
+
+    def _requeue(self, batch, size):
+        if self.depth + size > self.max_rows:
+            print(f"⚠️ Buffer full, dropping {size} rows")
+            self.dropped_rows += size
+            return
+        self._chunks.extendleft(reversed(batch))
+        self.depth += size
+
+    def stats(self):
+        return {
+            "queue_depth": self.depth,
+            "queue_capacity": self.max_rows,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "dropped_rows": self.dropped_rows,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_rows": self.last_flush_rows,
+            "last_flush_ms": round(self.last_flush_seconds * 1000, 2),
+        }
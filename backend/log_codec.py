@@ -0,0 +1,68 @@
+"""
+Split log lines into template + variable values and put them back together.
+
+Templates come from the Drain parser, which masks IPs, hex values and numbers
+as <IP>, <HEX> and <NUM>. Given a line and its template, split_params()
+returns the masked values in order; render() rebuilds the exact line from the
+template and those values.
+"""
+
+import re
+from functools import lru_cache
+
+PLACEHOLDER_RE = re.compile(r"<IP>|<HEX>|<NUM>")
+
+# What each placeholder may stand for (mirrors agent/parser/drain.go)
+VARIABLE_PATTERNS = {
+    "<IP>": r"(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})",
+    "<HEX>": r"(0x[0-9a-fA-F]+)",
+    "<NUM>": r"(\d+)",
+}
+
+TEMPLATE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def template_parts(template):
+    """Literal segments around the placeholders (one more than placeholders)."""
+    return tuple(PLACEHOLDER_RE.split(template))
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def template_formatter(template):
+    """(str.format pattern with one {} per placeholder, number of placeholders)."""
+    # Braces that are part of the template itself are escaped
+    parts = template_parts(template)
+    escaped = [part.replace("{", "{{").replace("}", "}}") for part in parts]
+    return "{}".join(escaped), len(parts) - 1
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _matcher(template):
+    pattern = []
+    last = 0
+    for m in PLACEHOLDER_RE.finditer(template):
+        pattern.append(re.escape(template[last:m.start()]))
+        pattern.append(VARIABLE_PATTERNS[m.group()])
+        last = m.end()
+    pattern.append(re.escape(template[last:]))
+    return re.compile("".join(pattern), re.DOTALL)
+
+
+def split_params(template, content):
+    """
+    Variable values of `content` under `template`, or None when the line can't
+    be rebuilt from the template (e.g. it doesn't actually match it).
+    """
+    m = _matcher(template).fullmatch(content)
+    if m is None:
+        return None
+    return list(m.groups())
+
+
+def render(template, params):
+    """Rebuild the original line from its template and variable values."""
+    fmt, expected = template_formatter(template)
+    if len(params) != expected:
+        raise ValueError(f"Template expects {expected} values, got {len(params)}")
+    return fmt.format(*params)
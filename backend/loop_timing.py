@@ -0,0 +1,138 @@
+"""
+Timing for the analyzers' polling loops.
+
+- TickClock: fixed-rate scheduling. Ticks are due at whole multiples of
+  the interval (plus an offset) on the wall clock, instead of `interval`
+  seconds after the previous tick finished, so the windows the analyzer
+  reads follow each other without gaps or overlaps however long a tick
+  takes. A tick that falls more than one interval behind skips ahead; the
+  skipped ticks are counted.
+- TickStats: per-phase durations (with tick_stats.phase("fetch"): ...) and
+  each tick's lag behind its due time, summarized as p50 / p95 / max over
+  the last `summary_every` ticks (for a phase that doesn't run every tick,
+  such as the anomaly write: over its last `summary_every` runs).
+- SamplingProfiler: opt-in sampling of the loop's call stack from a
+  background thread, written as folded stacks ("a;b;c <count>" per line)
+  for flamegraph.pl, speedscope or inferno. Samples taken while the loop
+  sleeps in TickClock.wait are left out.
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+class TickClock:
+    def __init__(self, interval, offset=0.0):
+        self.interval = interval
+        self.offset = offset
+        self.missed = 0
+        self._due = self._next_due(time.time())
+
+    def _next_due(self, now):
+        return math.floor((now - self.offset) / self.interval + 1) * self.interval + self.offset
+
+    def wait(self):
+        """Sleep until the next tick is due. Returns how late it started (s)."""
+        now = time.time()
+        if self._due < now - self.interval:
+            # More than a whole interval behind: drop the ticks we can't make
+            due = self._next_due(now) - self.interval
+            self.missed += round((due - self._due) / self.interval)
+            self._due = due
+        if self._due > now:
+            time.sleep(self._due - now)
+        lag = time.time() - self._due
+        self._due += self.interval
+        return lag
+
+
+def _percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+class TickStats:
+    def __init__(self, summary_every=30):
+        self.summary_every = summary_every
+        self._phases = defaultdict(lambda: deque(maxlen=summary_every))
+        self._lags = deque(maxlen=summary_every)
+        self._ticks = 0
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._phases[name].append(time.perf_counter() - start)
+
+    def tick(self, lag):
+        """Record the start of a tick that began `lag` seconds late."""
+        self._lags.append(lag)
+        self._ticks += 1
+
+    def due_summary(self):
+        return self.summary_every and self._ticks and self._ticks % self.summary_every == 0
+
+    def summary(self, missed=0):
+        """One line: p50 / p95 / max in ms of every phase and of the tick lag."""
+        parts = []
+        for name, values in list(self._phases.items()) + [("lag", self._lags)]:
+            if values:
+                ms = sorted(v * 1000 for v in values)
+                parts.append(f"{name} {_percentile(ms, 50):.1f}/{_percentile(ms, 95):.1f}/{ms[-1]:.1f}")
+        return (f"⏱️  Last {len(self._lags)} ticks (ms p50/p95/max): " + " | ".join(parts)
+                + f" | missed ticks: {missed}")
+
+
+class SamplingProfiler:
+    def __init__(self, path, interval=0.001, write_every=10.0, idle_code=(TickClock.wait.__code__,)):
+        self.path = path
+        self.interval = interval
+        self.write_every = write_every
+        self.idle_code = frozenset(idle_code)
+        self.stacks = defaultdict(int)
+        self.idle_samples = 0
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        """Start sampling the calling thread."""
+        self._thread_id = threading.get_ident()
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+        self.write()
+
+    def _run(self):
+        last_write = time.monotonic()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            if frame.f_code in self.idle_code:
+                self.idle_samples += 1
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            if time.monotonic() - last_write >= self.write_every:
+                self.write()
+                last_write = time.monotonic()
+
+    def write(self):
+        lines = [f"{stack} {count}" for stack, count in sorted(self.stacks.items())]
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write("\n".join(lines) + "\n" if lines else "")
+        os.replace(tmp, self.path)
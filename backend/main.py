@@ -1,71 +1,608 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
+from pydantic import TypeAdapter, ValidationError
 from typing import List
-import psycopg2
-from psycopg2.extras import execute_values
+import asyncio
+import time
+import zlib
+import itertools
+from datetime import timedelta
+import asyncpg
 import uvicorn
 import sys
 import numpy as np
+from storage import write_logs, merge_staging, maintain_partitions, WRITE_MODES, CONTENT_STORAGE
+from ingest_buffer import IngestBuffer
+from admission import AdmissionController
+from ndjson_stream import NDJSONDecoder, UnsupportedEncoding
+from wire_format import BatchDecoder, WireFormatError
+from template_dictionary import ResolveError, SourceDictionary, TemplateDictionary
+from template_store import KnownTemplates
+from drain import DrainTree, mask
+from detector import Detector
+from baselines import make_baseline
+from embedded_detector import EmbeddedDetector, INSERT_ANOMALY_QUERY
+from metrics import Registry, RequestMetrics, SampledLog, CONTENT_TYPE, BATCH_BUCKETS
+from settings import DB_CONFIG, TEMPLATE_CACHE_SIZE
+from models import LogItem
 app = FastAPI()
 
 # --- CONFIGURATION ---
-DB_CONFIG = {
-    "host": "localhost",
-    "database": "logiq",
-    "user": "admin",
-    "password": "password"
-}
+# DB_CONFIG and TEMPLATE_CACHE_SIZE are in settings.py (shared with bulk_import.py)
+
+# Long-lived connection pool shared by every request. MIN_SIZE connections are
+# opened (and authenticated) at startup; the pool grows up to MAX_SIZE under load.
+DB_POOL_MIN_SIZE = 4
+DB_POOL_MAX_SIZE = 16
+DB_HEALTH_CHECK_INTERVAL = 5  # seconds between background pool pings
+
+# How /ingest writes batches: "copy" streams rows with binary COPY FROM STDIN,
+# "insert" sends a single INSERT ... SELECT unnest(...) statement.
+INGEST_WRITE_MODE = "copy"
+
+# How line content is stored: "full" keeps raw_content as sent, "params" keeps
+# only the variable values next to the template ID and rebuilds lines on read
+# (the logs_full view), which is several times smaller for templated traffic.
+RAW_CONTENT_STORAGE = "full"
+
+# For very high rates: land batches in the UNLOGGED logs_staging table and
+# merge them into logs every STAGING_MERGE_INTERVAL seconds. Keep the interval
+# well below the analyzer's CHECK_INTERVAL so its windows stay complete.
+USE_STAGING_TABLE = False
+STAGING_MERGE_INTERVAL = 0.5
+
+# logs is partitioned by hour. Every PARTITION_MAINTENANCE_INTERVAL seconds the
+# service makes sure the next PARTITIONS_AHEAD_HOURS partitions exist and drops
+# partitions older than LOG_RETENTION (None keeps logs forever).
+PARTITION_MAINTENANCE_INTERVAL = 300
+PARTITIONS_AHEAD_HOURS = 3
+LOG_RETENTION = timedelta(hours=24)
+
+# Lines sent without a template are templated here. "drain" masks them with
+# the agent's rules (drain.mask, no state kept); "drain-tree" uses the Drain
+# parse tree, which groups lines much better but generalizes templates in
+# place, so a template can be stored (and reported as new) once more each
+# time it gains a <*>. See eval_drain.py.
+SERVER_PARSER = "drain"
+
+# Source name -> ID cache in front of the sources table (one per host/service)
+SOURCE_CACHE_SIZE = 50_000
+
+# Write-behind buffering: /ingest queues rows in memory and returns 202 right
+# away. A background flusher coalesces the queue into one DB write as soon as
+# FLUSH_MAX_ROWS rows are pending or every FLUSH_MAX_LATENCY seconds.
+WRITE_BEHIND_ENABLED = True
+FLUSH_MAX_ROWS = 5000
+FLUSH_MAX_LATENCY = 0.25  # seconds
+BUFFER_MAX_ROWS = 100_000  # queue depth limit; /ingest answers 503 beyond it
+
+# Admission control: past these high-water marks /ingest sheds load with a
+# Retry-After hint instead of letting work pile up. 429 = too many rows
+# pending (slow down), 503 = DB slow, saturated or unreachable.
+SHED_PENDING_ROWS = 80_000  # queued + in-flight rows
+SHED_WRITE_LATENCY = 2.0  # seconds per DB write (moving average)
+SHED_POOL_BUSY_RATIO = 0.95  # share of pool connections checked out
+RETRY_AFTER_MAX = 30  # seconds
+
+# Persistent WebSocket ingest (/ingest/ws): a client may have up to
+# WS_WINDOW_FRAMES frames in flight; the server acknowledges cumulatively every
+# WS_ACK_EVERY frames (or after WS_ACK_INTERVAL seconds of quiet) and only
+# hands out more credit while admission control accepts new work.
+WS_WINDOW_FRAMES = 64
+WS_ACK_EVERY = 16
+WS_ACK_INTERVAL = 0.05  # seconds
+
+# Embedded detection: run the frequency + pattern detectors of
+# analyzer_enhanced.py inside this service, fed by every accepted batch, so
+# anomalies are raised within milliseconds and only anomaly rows hit the DB.
+# Leave it off and run analyzer_enhanced.py separately for split deployments
+# (not both, or anomalies get recorded twice).
+EMBEDDED_DETECTION = False
+DETECTION_WINDOW = 2  # seconds, same as the analyzer's CHECK_INTERVAL
+DETECTION_HISTORY_WINDOWS = 10
+DETECTION_SIGMA = 3
+DETECTION_LEARNING_WINDOWS = 5
+DETECTION_BASELINE = "window"  # baseline engine, see baselines.py
+# Known templates for pattern detection, as hashes in a fixed memory budget
+# (template_store.py): an exact LRU of the most recent ones, the rest in a
+# Bloom filter. Its false-positive rate (new templates passing as known) is in
+# /ingest/stats and /metrics; it climbs past DETECTION_EXPECTED_TEMPLATES.
+DETECTION_TEMPLATE_MEMORY = 2 << 20  # bytes
+DETECTION_TEMPLATE_LRU_SIZE = 10_000
+DETECTION_EXPECTED_TEMPLATES = 200_000
+
+# Synchronous writes (WRITE_BEHIND_ENABLED = False) print one "Inserted"
+# summary per INGEST_LOG_EVERY requests; 0 turns it off. /metrics has the
+# exact counts either way.
+INGEST_LOG_EVERY = 1000
+
+# Errors asyncpg raises when the database is down or a connection breaks, and
+# template / source IDs that wouldn't resolve (template_dictionary.py)
+DB_ERRORS = (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError, ResolveError)
+# Subset worth retrying: the rows are fine, the connection (or a racing
+# dictionary insert) is not
+DB_CONNECTION_ERRORS = (OSError, asyncio.TimeoutError, asyncpg.PostgresConnectionError, asyncpg.InterfaceError,
+                        ResolveError)
 
 # --- DATA MODEL ---
-class LogItem(BaseModel):
-    content: str
-    template: str
+# LogItem is in models.py
+log_items = TypeAdapter(List[LogItem])
+
+# --- CONNECTION POOL ---
+db_pool = None
+db_connected = False
+monitor_task = None
+merge_task = None
+flush_task = None
+partition_task = None
+detection_task = None
 
-# --- UTILITY: Get DB Connection ---
-def get_db_connection():
+async def create_db_pool():
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        return conn
-    except psycopg2.OperationalError as e:
+        return await asyncpg.create_pool(
+            min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE, **DB_CONFIG
+        )
+    except DB_ERRORS as e:
         print(f"❌ DB CONNECTION ERROR: {e}")
         return None
 
+async def monitor_db_pool():
+    """Background task: (re)create the pool if needed and ping it periodically."""
+    global db_pool, db_connected
+    while True:
+        if db_pool is None:
+            db_pool = await create_db_pool()
+        if db_pool is not None:
+            try:
+                async with db_pool.acquire(timeout=DB_HEALTH_CHECK_INTERVAL) as conn:
+                    await conn.fetchval("SELECT 1")
+                if not db_connected:
+                    print(f"✅ DB pool ready ({db_pool.get_size()} connections)")
+                db_connected = True
+            except DB_ERRORS as e:
+                if db_connected:
+                    print(f"❌ DB HEALTH CHECK FAILED: {e}")
+                db_connected = False
+        await asyncio.sleep(DB_HEALTH_CHECK_INTERVAL)
+
+async def merge_staging_loop():
+    """Background task: periodically move staged rows into the logs table."""
+    while True:
+        await asyncio.sleep(STAGING_MERGE_INTERVAL)
+        if db_pool is None:
+            continue
+        try:
+            async with db_pool.acquire() as conn:
+                await merge_staging(conn)
+        except DB_ERRORS as e:
+            print(f"⚠️ STAGING MERGE ERROR: {e}")
+
+async def partition_maintenance_loop():
+    """Background task: keep upcoming log partitions created, drop expired ones."""
+    while True:
+        if db_pool is not None:
+            try:
+                async with db_pool.acquire() as conn:
+                    created, dropped = await maintain_partitions(conn, PARTITIONS_AHEAD_HOURS, LOG_RETENTION)
+                if created or dropped:
+                    print(f"🗂️ Log partitions: {created} created, {dropped} dropped")
+            except DB_ERRORS as e:
+                print(f"⚠️ PARTITION MAINTENANCE ERROR: {e}")
+        await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL)
+
+template_ids = TemplateDictionary(TEMPLATE_CACHE_SIZE)
+source_ids = SourceDictionary(SOURCE_CACHE_SIZE)
+# Only the template is used: the event IDs DrainParser adds on top of
+# mask() would be computed for nothing, so "drain" calls mask() directly
+log_parser = DrainTree() if SERVER_PARSER == "drain-tree" else None
+
+def template_of(content):
+    """Server-side template of a line sent without one (all ingest paths)."""
+    return mask(content) if log_parser is None else log_parser.parse(content)[1]
+
+admission = AdmissionController(
+    max_pending_rows=SHED_PENDING_ROWS,
+    max_write_latency=SHED_WRITE_LATENCY,
+    max_pool_busy_ratio=SHED_POOL_BUSY_RATIO,
+    max_retry_after=RETRY_AFTER_MAX,
+)
+
+async def write_batch(rows, count):
+    """Write rows on a pooled connection and record how long the DB took."""
+    if db_pool is None:
+        raise ConnectionError("Database Unavailable")
+    timings = {}
+    start = time.perf_counter()
+    async with db_pool.acquire() as conn:
+        acquired = time.perf_counter()
+        await write_logs(conn, rows, template_ids, INGEST_WRITE_MODE, USE_STAGING_TABLE, RAW_CONTENT_STORAGE,
+                         timings=timings, sources=source_ids)
+    admission.record_write(count, time.perf_counter() - start)
+    ingest_phase.observe(acquired - start, "connection_wait")
+    for phase, seconds in timings.items():
+        ingest_phase.observe(seconds, phase)
+    batch_rows.observe(count, "write")
+
+async def write_anomalies(records):
+    if db_pool is None:
+        raise ConnectionError("Database Unavailable")
+    async with db_pool.acquire() as conn:
+        await conn.executemany(INSERT_ANOMALY_QUERY, records)
+
+embedded_detector = EmbeddedDetector(
+    Detector(DETECTION_HISTORY_WINDOWS, DETECTION_SIGMA, DETECTION_LEARNING_WINDOWS,
+             make_baseline(DETECTION_BASELINE, DETECTION_HISTORY_WINDOWS, DETECTION_WINDOW),
+             known_templates=KnownTemplates(DETECTION_TEMPLATE_MEMORY, DETECTION_TEMPLATE_LRU_SIZE,
+                                            DETECTION_EXPECTED_TEMPLATES)),
+    window_seconds=DETECTION_WINDOW,
+    write=write_anomalies,
+)
+
+ingest_buffer = IngestBuffer(
+    write_batch,
+    flush_rows=FLUSH_MAX_ROWS,
+    flush_interval=FLUSH_MAX_LATENCY,
+    max_rows=BUFFER_MAX_ROWS,
+    retry_errors=DB_CONNECTION_ERRORS,
+)
+
+# --- METRICS (GET /metrics) ---
+metrics = Registry()
+http_requests = metrics.counter(
+    "logiq_http_requests_total", "HTTP requests by route, method and status", ("route", "method", "status"))
+http_latency = metrics.histogram(
+    "logiq_http_request_seconds", "HTTP request latency by route", labels=("route",))
+ingest_phase = metrics.histogram(
+    "logiq_ingest_phase_seconds",
+    "Time per ingest phase: validate (decode + validate a request body or WebSocket frame), "
+    "connection_wait (pool acquire), resolve (template IDs), write (COPY/INSERT + rollups), commit",
+    labels=("phase",))
+batch_rows = metrics.histogram(
+    "logiq_ingest_batch_rows", "Rows per accepted request/frame (request) and per DB write (write)",
+    buckets=BATCH_BUCKETS, labels=("stage",))
+ingest_errors = metrics.counter(
+    "logiq_ingest_errors_total", "Ingest errors: invalid payloads and failed synchronous writes", ("kind",))
+metrics.callback("logiq_ingest_rows_total", "Rows accepted by admission control",
+                 lambda: admission.accepted_rows, kind="counter")
+metrics.callback("logiq_ingest_shed_requests_total", "Requests shed by admission control, by reason",
+                 lambda: {(reason,): n for reason, n in admission.shed_requests.items()},
+                 kind="counter", labels=("reason",))
+metrics.callback("logiq_buffer_depth_rows", "Rows queued in the write-behind buffer", lambda: ingest_buffer.depth)
+metrics.callback("logiq_buffer_flushed_rows_total", "Rows written by the write-behind flusher",
+                 lambda: ingest_buffer.flushed_rows, kind="counter")
+metrics.callback("logiq_buffer_dropped_rows_total", "Rows the write-behind flusher gave up on",
+                 lambda: ingest_buffer.dropped_rows, kind="counter")
+metrics.callback("logiq_buffer_failed_flushes_total", "Write-behind flushes that failed (re-queued or dropped)",
+                 lambda: ingest_buffer.failed_flushes, kind="counter")
+metrics.callback("logiq_db_write_latency_seconds", "Moving average of DB write latency (admission control)",
+                 lambda: admission.write_latency)
+metrics.callback("logiq_db_pool_connections", "DB pool connections by state",
+                 lambda: {} if db_pool is None else {
+                     ("busy",): db_pool.get_size() - db_pool.get_idle_size(),
+                     ("idle",): db_pool.get_idle_size(),
+                 }, labels=("state",))
+metrics.callback("logiq_db_connected", "1 if the last DB health check passed", lambda: int(db_connected))
+metrics.callback("logiq_template_cache_entries", "Template IDs cached in memory",
+                 lambda: template_ids.stats()["cached_templates"])
+metrics.callback("logiq_source_cache_entries", "Source IDs cached in memory",
+                 lambda: source_ids.stats()["cached_sources"])
+if EMBEDDED_DETECTION:
+    metrics.callback("logiq_known_templates", "Templates known to the embedded pattern detector",
+                     lambda: len(embedded_detector.detector.seen_templates))
+    metrics.callback("logiq_known_templates_false_positive_rate",
+                     "Estimated chance that a new template passes as known",
+                     lambda: embedded_detector.detector.seen_templates.false_positive_rate())
+
+app.add_middleware(
+    RequestMetrics, requests=http_requests, latency=http_latency,
+    routes=["/", "/ingest", "/ingest/ndjson", "/ingest/packed", "/ingest/stats", "/metrics"],
+)
+
+inserted_log = SampledLog(INGEST_LOG_EVERY, "✅ Inserted {rows} logs ({events} requests).")
+
+@app.on_event("startup")
+async def open_db_pool():
+    global db_pool, db_connected, monitor_task, merge_task, flush_task, partition_task, detection_task
+    if INGEST_WRITE_MODE not in WRITE_MODES:
+        raise ValueError(f"INGEST_WRITE_MODE must be one of {WRITE_MODES}")
+    if RAW_CONTENT_STORAGE not in CONTENT_STORAGE:
+        raise ValueError(f"RAW_CONTENT_STORAGE must be one of {CONTENT_STORAGE}")
+    if SERVER_PARSER not in ("drain", "drain-tree"):
+        raise ValueError('SERVER_PARSER must be "drain" or "drain-tree"')
+    # Warm the pool before accepting traffic so the first requests don't pay
+    # the TCP + auth handshake.
+    db_pool = await create_db_pool()
+    db_connected = db_pool is not None
+    monitor_task = asyncio.create_task(monitor_db_pool())
+    partition_task = asyncio.create_task(partition_maintenance_loop())
+    if USE_STAGING_TABLE:
+        merge_task = asyncio.create_task(merge_staging_loop())
+    if WRITE_BEHIND_ENABLED:
+        flush_task = asyncio.create_task(ingest_buffer.run())
+    if EMBEDDED_DETECTION:
+        detection_task = asyncio.create_task(embedded_detector.run())
+
+@app.on_event("shutdown")
+async def close_db_pool():
+    monitor_task.cancel()
+    partition_task.cancel()
+    if detection_task is not None:
+        detection_task.cancel()
+    if flush_task is not None:
+        # Let an in-flight flush finish: cancelling it would lose its rows
+        ingest_buffer.stop()
+        await flush_task
+        await ingest_buffer.drain()
+    if merge_task is not None:
+        merge_task.cancel()
+    if db_pool is not None:
+        if USE_STAGING_TABLE:
+            async with db_pool.acquire() as conn:
+                await merge_staging(conn)
+        await db_pool.close()
+
 # --- HEALTH CHECK (Open http://localhost:8000 in browser) ---
 @app.get("/")
-def health_check():
-    conn = get_db_connection()
-    if conn:
-        conn.close()
-        return {"status": "Online", "database": "Connected ✅"}
-    return {"status": "Online", "database": "Disconnected ❌ (Check Docker)"}
+async def health_check():
+    if db_pool is not None:
+        try:
+            async with db_pool.acquire(timeout=DB_HEALTH_CHECK_INTERVAL) as conn:
+                await conn.fetchval("SELECT 1")
+            return {
+                "status": "Online",
+                "database": "Connected ✅",
+                "pool_size": db_pool.get_size(),
+                "queue_depth": ingest_buffer.depth,
+            }
+        except DB_ERRORS:
+            pass
+    return {"status": "Online", "database": "Disconnected ❌ (Check Docker)", "queue_depth": ingest_buffer.depth}
 
 # --- INGESTION API ---
-@app.post("/ingest")
-def ingest_logs(logs: List[LogItem]):
-    conn = get_db_connection()
-    if not conn:
+async def accept_rows(rows):
+    """
+    Admit a list of (template, content, source) rows and hand them to the write path.
+    Returns True if they were queued (write-behind), False if already written.
+    Raises HTTPException when the rows are shed or the write fails.
+    """
+    batch_rows.observe(len(rows), "request")
+    verdict = admission.check(len(rows), ingest_buffer.depth, db_pool, db_connected)
+    if verdict is not None:
+        status_code, reason, retry_after = verdict
+        raise HTTPException(
+            status_code=status_code,
+            detail=f"Overloaded ({reason}), retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    if WRITE_BEHIND_ENABLED:
+        if not ingest_buffer.offer(rows):
+            raise HTTPException(status_code=503, detail="Ingest buffer full", headers={"Retry-After": "1"})
+        if EMBEDDED_DETECTION:
+            embedded_detector.feed(rows)
+        return True
+
+    if db_pool is None:
         raise HTTPException(status_code=500, detail="Database Unavailable")
-    
-    cursor = conn.cursor()
-    
-    # Efficient Bulk Insert
-    query = "INSERT INTO logs (log_template, raw_content) VALUES %s"
-    data_tuples = [(log.template, log.content) for log in logs]
-    
+
+    admission.in_flight_rows += len(rows)
     try:
-        execute_values(cursor, query, data_tuples)
-        conn.commit()
-        print(f"✅ Inserted {len(logs)} logs.")
-    except Exception as e:
-        conn.rollback()
+        await write_batch(rows, len(rows))
+        inserted_log.record(len(rows))
+    except DB_ERRORS as e:
+        ingest_errors.inc("write")
         print(f"⚠️ INSERT ERROR: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        cursor.close()
-        conn.close()
-        
+        admission.in_flight_rows -= len(rows)
+    if EMBEDDED_DETECTION:
+        embedded_detector.feed(rows)
+    return False
+
+# The body is validated here rather than by a List[LogItem] parameter, so the
+# time it takes shows up in /metrics; errors keep FastAPI's 422 format.
+@app.post("/ingest")
+async def ingest_logs(request: Request, response: Response):
+    body = await request.body()
+    start = time.perf_counter()
+    try:
+        logs = log_items.validate_json(body)
+    except ValidationError as e:
+        ingest_errors.inc("invalid_payload")
+        raise RequestValidationError(e.errors(include_url=False))
+    rows = [
+        (log.template if log.template is not None else template_of(log.content), log.content, log.source)
+        for log in logs
+    ]
+    ingest_phase.observe(time.perf_counter() - start, "validate")
+    if await accept_rows(rows):
+        response.status_code = 202
+        return {"status": "queued", "count": len(logs)}
     return {"status": "received", "count": len(logs)}
 
+# Streaming variant for high-volume shippers: newline-delimited JSON objects
+# ({"content": ..., "template": ..., "source": ...} per line, template and
+# source optional as for /ingest), optionally compressed with
+# Content-Encoding: gzip / deflate / zstd. The body is decoded while it
+# streams in and rows go to the write path chunk by chunk, so large bodies
+# never sit in memory. If a chunk is shed midway, the error reports how many
+# rows were already accepted so the client can resume from there.
+@app.post("/ingest/ndjson")
+async def ingest_ndjson(request: Request, response: Response):
+    try:
+        decoder = NDJSONDecoder(request.headers.get("content-encoding"), template_of)
+    except UnsupportedEncoding as e:
+        ingest_errors.inc("invalid_payload")
+        raise HTTPException(status_code=415, detail=str(e))
+
+    accepted = 0
+    queued = False
+
+    async def accept(rows):
+        nonlocal accepted, queued
+        try:
+            queued = await accept_rows(rows)
+        except HTTPException as e:
+            e.detail = {"error": e.detail, "accepted": accepted}
+            raise
+        accepted += len(rows)
+
+    decoding = 0.0  # seconds spent decoding, without the waits on the network and the DB
+
+    async def accept_all(batches):
+        nonlocal decoding
+        while True:
+            start = time.perf_counter()
+            rows = next(batches, None)
+            decoding += time.perf_counter() - start
+            if rows is None:
+                return
+            await accept(rows)
+
+    try:
+        async for chunk in request.stream():
+            await accept_all(decoder.feed(chunk))
+        await accept_all(decoder.close())
+    except (ValueError, zlib.error) as e:
+        ingest_errors.inc("invalid_payload")
+        raise HTTPException(status_code=400, detail={"error": str(e), "accepted": accepted})
+    ingest_phase.observe(decoding, "validate")
+
+    if queued:
+        response.status_code = 202
+    return {"status": "queued" if queued else "received", "count": accepted, "rejected": decoder.rejected}
+
+# Compact batches from the agent: templates are sent once and rows carry only
+# a template ID plus the variable values (see wire_format.py).
+@app.post("/ingest/packed")
+async def ingest_packed(request: Request, response: Response):
+    body = await request.body()
+    start = time.perf_counter()
+    try:
+        rows = BatchDecoder().decode(body)
+    except WireFormatError as e:
+        ingest_errors.inc("invalid_payload")
+        raise HTTPException(status_code=400, detail=str(e))
+    ingest_phase.observe(time.perf_counter() - start, "validate")
+
+    if await accept_rows(rows):
+        response.status_code = 202
+        return {"status": "queued", "count": len(rows)}
+    return {"status": "received", "count": len(rows)}
+
+# Persistent streaming channel for shippers on a firehose.
+#
+# Client -> server frames:
+#   binary: a packed batch (wire_format.py); template IDs persist for the
+#           whole connection, so each template is sent once
+#   text:   one or more NDJSON lines, as for /ingest/ndjson
+# Server -> client messages (JSON text):
+#   {"type": "credit", "credit": N}
+#       N more frames may be sent (the initial window is WS_WINDOW_FRAMES)
+#   {"type": "ack", "frames": F, "rows": R, "rejected": X, "credit": N}
+#       cumulative: the first F frames (R rows) were accepted; grants N frames
+#   {"type": "error", "frame": F, "detail": "..."}   sent before closing
+#
+# Credit is only returned while admission control accepts new work, so an
+# overloaded server stops producers instead of queueing for them. A frame that
+# arrives while the server is shedding is held (not dropped) until it fits.
+@app.websocket("/ingest/ws")
+async def ingest_ws(websocket: WebSocket):
+    await websocket.accept()
+    decoder = BatchDecoder()
+    send_lock = asyncio.Lock()
+    frames = rows_accepted = rejected = 0
+    acked = 0  # frames covered by the last ack
+    owed_credit = 0  # credit withheld while the server was overloaded
+
+    async def send_ack():
+        nonlocal acked, owed_credit
+        async with send_lock:
+            new_frames = frames - acked
+            can_grant = not admission.overloaded(ingest_buffer.depth, db_pool, db_connected)
+            if not new_frames and not (owed_credit and can_grant):
+                return
+            owed_credit += new_frames
+            credit = owed_credit if can_grant else 0
+            owed_credit -= credit
+            acked = frames
+            await websocket.send_json({
+                "type": "ack", "frames": frames, "rows": rows_accepted,
+                "rejected": rejected, "credit": credit,
+            })
+
+    async def ack_timer():
+        # Covers quiet periods: acks trailing frames and re-grants withheld credit
+        while True:
+            await asyncio.sleep(WS_ACK_INTERVAL)
+            try:
+                await send_ack()
+            except Exception:
+                return  # connection is gone
+
+    async def accept_frame(rows):
+        while True:
+            try:
+                await accept_rows(rows)
+                return
+            except HTTPException as e:
+                if e.status_code not in (429, 503):
+                    raise
+                await asyncio.sleep(WS_ACK_INTERVAL)
+
+    await websocket.send_json({"type": "credit", "credit": WS_WINDOW_FRAMES})
+    timer = asyncio.create_task(ack_timer())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            try:
+                start = time.perf_counter()
+                if message.get("bytes") is not None:
+                    rows = decoder.decode(message["bytes"])
+                else:
+                    ndjson = NDJSONDecoder(template_of=template_of)
+                    data = message["text"].encode()
+                    rows = list(itertools.chain.from_iterable(itertools.chain(ndjson.feed(data), ndjson.close())))
+                    rejected += ndjson.rejected
+                ingest_phase.observe(time.perf_counter() - start, "validate")
+                if rows:
+                    await accept_frame(rows)
+            except (WireFormatError, ValueError, HTTPException) as e:
+                ingest_errors.inc("invalid_payload" if not isinstance(e, HTTPException) else "write")
+                detail = e.detail if isinstance(e, HTTPException) else str(e)
+                async with send_lock:
+                    await websocket.send_json({"type": "error", "frame": frames + 1, "detail": detail})
+                await websocket.close(code=1007)
+                break
+
+            frames += 1
+            rows_accepted += len(rows)
+            if frames - acked >= WS_ACK_EVERY:
+                await send_ack()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        timer.cancel()
+
+# --- MONITORING ---
+@app.get("/ingest/stats")
+async def ingest_stats():
+    return {
+        "write_behind": WRITE_BEHIND_ENABLED,
+        **ingest_buffer.stats(),
+        "admission": admission.stats(),
+        "templates": template_ids.stats(),
+        "sources": source_ids.stats(),
+        "parser": {"name": SERVER_PARSER, **(log_parser.stats() if log_parser is not None else {})},
+        "detection": embedded_detector.stats() if EMBEDDED_DETECTION else None,
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
 if __name__ == "__main__":
     print("🚀 Starting Backend on http://0.0.0.0:8000")
     # Using reload=True helps see errors immediately
@@ -0,0 +1,180 @@
+"""
+In-process metrics for the ingest service, served as Prometheus text
+(exposition format 0.0.4) on GET /metrics.
+
+Counters and histograms are plain dicts keyed by label values, updated
+inline on the hot path (no locks: everything runs on the event loop).
+Numbers other components already keep (buffer depth, admission decisions,
+template cache) are read at scrape time through callbacks instead of being
+counted twice.
+
+RequestMetrics is a bare ASGI middleware: it counts every HTTP request and
+times it from the first byte received to the last byte sent, with the route
+as a label. Unknown paths are reported as "other" to bound label cardinality.
+"""
+
+import time
+from bisect import bisect_left
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers a cached sub-millisecond accept up to a stalled DB write
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Rows per request / per DB write
+BATCH_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000, 10_000, 50_000)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, count in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, values)} {_number(count)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._series = {}  # label values -> [per-bucket counts (+Inf last), sum]
+
+    def observe(self, value, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _labels(self.labels + ("le",), values + (_number(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Callback:
+    """A gauge or counter whose value is read at scrape time. `read` returns a
+    number, or a dict of label value tuples -> number."""
+
+    def __init__(self, name, help, read, kind="gauge", labels=()):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.kind = kind
+        self.labels = tuple(labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        value = self.read()
+        samples = value.items() if isinstance(value, dict) else [((), value)]
+        for values, number in sorted(samples):
+            if number is not None:
+                lines.append(f"{self.name}{_labels(self.labels, values)} {_number(number)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, labels=()):
+        return self._add(Histogram(name, help, buckets, labels))
+
+    def callback(self, name, help, read, kind="gauge", labels=()):
+        return self._add(Callback(name, help, read, kind, labels))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class RequestMetrics:
+    """ASGI middleware: request count by route/method/status, latency by route."""
+
+    def __init__(self, app, requests, latency, routes):
+        self.app = app
+        self.requests = requests  # Counter(route, method, status)
+        self.latency = latency  # Histogram(route)
+        self.routes = frozenset(routes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        route = scope["path"] if scope["path"] in self.routes else "other"
+        status = 500  # if the app raises before responding
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.latency.observe(time.perf_counter() - start, route)
+            self.requests.inc(route, scope["method"], status)
+
+
+class SampledLog:
+    """Prints one summary line per `every` events instead of one per event
+    (every=0 turns it off)."""
+
+    def __init__(self, every, message):
+        self.every = every
+        self.message = message  # format string with {events} and {rows}
+        self._events = 0
+        self._rows = 0
+
+    def record(self, rows):
+        if not self.every:
+            return
+        self._events += 1
+        self._rows += rows
+        if self._events >= self.every:
+            print(self.message.format(events=self._events, rows=self._rows))
+            self._events = self._rows = 0
@@ -0,0 +1,14 @@
+"""
+Request models of the ingest service, importable without building the app
+(bench_wire_format.py validates against them).
+"""
+
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class LogItem(BaseModel):
+    content: str
+    template: Optional[str] = None  # templated server-side when missing
+    source: str = ""  # host / service the line came from; detection keeps a baseline per source
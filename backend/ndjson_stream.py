@@ -0,0 +1,192 @@
+"""
+Incremental decoder for newline-delimited JSON ingest bodies.
+
+The request body is fed in as it streams in; it is decompressed (gzip, deflate
+or zstd) and split into lines on the fly, and each line becomes a
+(template, content, source) row. Only one decompressed piece plus one partial
+line are held in memory at a time, so memory stays flat regardless of body
+size.
+
+Each line is a JSON object: {"content": "...", "template": "...", "source": "..."}
+(source is optional; template too when the decoder is given a template_of
+function, which then templates the content like /ingest does).
+"""
+
+import zlib
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    import json
+    json_loads = json.loads
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Upper bound on decompressed bytes produced per step (guards against
+# compression bombs turning one small network chunk into a huge buffer)
+MAX_PIECE_BYTES = 256 * 1024
+# zstd has no output limit per call, so compressed input is fed in slices this
+# small to keep each decompressed piece to a handful of zstd blocks
+ZSTD_INPUT_SLICE = 1024
+# Rows are handed to the write path in lists of at most this many
+MAX_ROWS_PER_CHUNK = 5000
+# A single line longer than this is rejected instead of buffered forever
+MAX_LINE_BYTES = 1024 * 1024
+
+
+class UnsupportedEncoding(ValueError):
+    pass
+
+
+class _ZlibStream:
+    """zlib/gzip decompressor with bounded output and multi-member gzip support."""
+
+    def __init__(self, wbits):
+        self._wbits = wbits
+        self._d = zlib.decompressobj(wbits=wbits)
+        self._partial = False  # inside a member that hasn't ended yet
+
+    def decompress(self, data):
+        while data:
+            self._partial = True
+            piece = self._d.decompress(data, MAX_PIECE_BYTES)
+            if piece:
+                yield piece
+            if self._d.eof:
+                # Concatenated gzip members: start over on the leftover bytes
+                self._partial = False
+                data = self._d.unused_data
+                self._d = zlib.decompressobj(wbits=self._wbits)
+            else:
+                data = self._d.unconsumed_tail
+
+    def flush(self):
+        piece = self._d.flush()
+        if piece:
+            yield piece
+        if self._partial and not self._d.eof:
+            raise ValueError("Truncated compressed body")
+
+
+class _ZstdStream:
+    """zstd decompressor that continues across concatenated frames. Errors
+    are raised as ValueError, like the other encodings' (zlib.error aside)."""
+
+    def __init__(self):
+        self._d = zstandard.ZstdDecompressor().decompressobj()
+        self._partial = False  # inside a frame that hasn't ended yet
+
+    def decompress(self, data):
+        for i in range(0, len(data), ZSTD_INPUT_SLICE):
+            yield from self._decompress(data[i:i + ZSTD_INPUT_SLICE])
+
+    def _decompress(self, data):
+        while data:
+            self._partial = True
+            try:
+                piece = self._d.decompress(data)
+            except zstandard.ZstdError as e:
+                raise ValueError(str(e)) from e
+            if piece:
+                yield piece
+            if not self._d.eof:
+                break
+            self._partial = False
+            data = self._d.unused_data
+            self._d = zstandard.ZstdDecompressor().decompressobj()
+
+    def flush(self):
+        if self._partial:
+            raise ValueError("Truncated compressed body")
+        return iter(())
+
+
+class _Identity:
+    def decompress(self, data):
+        yield data
+
+    def flush(self):
+        return iter(())
+
+
+def make_decompressor(content_encoding):
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return _Identity()
+    if encoding in ("gzip", "x-gzip"):
+        return _ZlibStream(wbits=16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return _ZlibStream(wbits=zlib.MAX_WBITS)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise UnsupportedEncoding("zstd bodies need the 'zstandard' package installed")
+        return _ZstdStream()
+    raise UnsupportedEncoding(f"Unsupported Content-Encoding: {content_encoding}")
+
+
+class NDJSONDecoder:
+    def __init__(self, content_encoding=None, template_of=None):
+        # template_of: fn(content) -> template for lines without one; None
+        # rejects such lines
+        self._decompressor = make_decompressor(content_encoding)
+        self._template_of = template_of
+        self._tail = b""
+        self.rows = 0
+        self.rejected = 0
+
+    def feed(self, chunk):
+        """Feed raw body bytes; yields lists of (template, content, source) rows."""
+        for piece in self._decompressor.decompress(chunk):
+            yield from self._split(piece)
+
+    def close(self):
+        """Flush the decompressor and the final unterminated line."""
+        for piece in self._decompressor.flush():
+            yield from self._split(piece)
+        if self._tail.strip():
+            rows = self._parse([self._tail])
+            self._tail = b""
+            if rows:
+                yield rows
+
+    def _split(self, piece):
+        lines = (self._tail + piece).split(b"\n")
+        self._tail = lines.pop()
+        if len(self._tail) > MAX_LINE_BYTES:
+            raise ValueError(f"Line exceeds {MAX_LINE_BYTES} bytes")
+        for i in range(0, len(lines), MAX_ROWS_PER_CHUNK):
+            rows = self._parse(lines[i:i + MAX_ROWS_PER_CHUNK])
+            if rows:
+                yield rows
+
+    def _parse(self, lines):
+        rows = []
+        for line in lines:
+            if not line.strip():
+                continue
+            # Validation is just "an object with one to three strings";
+            # anything else is counted and skipped rather than failing the
+            # whole stream.
+            try:
+                obj = json_loads(line)
+                content = obj["content"]
+                template = obj.get("template")
+                source = obj.get("source", "")
+            except (ValueError, KeyError, TypeError):
+                self.rejected += 1
+                continue
+            if type(content) is not str or type(source) is not str:
+                self.rejected += 1
+                continue
+            if template is None and self._template_of is not None:
+                template = self._template_of(content)
+            elif type(template) is not str:
+                self.rejected += 1
+                continue
+            rows.append((template, content, source))
+        self.rows += len(rows)
+        return rows
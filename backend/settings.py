@@ -0,0 +1,16 @@
+"""
+Configuration shared by the ingest service (main.py) and the offline tools
+that write the same tables (bulk_import.py, bench_storage.py). It lives
+apart from main.py so that importing it doesn't build the FastAPI app and
+its background machinery.
+"""
+
+DB_CONFIG = {
+    "host": "localhost",
+    "database": "logiq",
+    "user": "admin",
+    "password": "password"
+}
+
+# Template text -> ID cache in front of the known_templates dictionary table
+TEMPLATE_CACHE_SIZE = 50_000
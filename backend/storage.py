@@ -0,0 +1,168 @@
+"""
+Write paths for the logs table, shared by the ingest endpoints.
+
+Rows are (template, content, source) tuples; source is the name of the host
+or service the line came from ("" if unknown). Templates and sources are
+interned through a TemplateDictionary / SourceDictionary, so the logs table
+only stores their integer IDs. Two write modes are available:
+- "insert": one INSERT ... SELECT unnest(...) statement per batch
+- "copy":   binary COPY ... FROM STDIN, streamed straight from the row iterable
+
+Either mode can target the UNLOGGED logs_staging table instead of logs; the
+ingest service then moves staged rows into logs with merge_staging() on a timer.
+
+Writes also add their counts to log_rollups (one row per second, source and
+template) in the same transaction, which is what the analyzers read.
+Backfills can opt out with rollups=False.
+
+logs is partitioned by hour on received_at; maintain_partitions() creates
+upcoming partitions and drops expired ones (logiq_maintain_partitions() in
+init_schema.sql).
+
+Line content is stored one of two ways:
+- "full":   raw_content holds the whole line
+- "params": only the variable values go into params (see log_codec.py) and
+            the line is rebuilt on read (logs_full view / log_codec.render);
+            lines that don't fit their template keep raw_content
+"""
+
+import time
+from collections import Counter
+
+from log_codec import split_params
+
+LOGS_TABLE = "logs"
+STAGING_TABLE = "logs_staging"
+LOG_COLUMNS = ("template_id", "source_id", "raw_content", "params")
+
+WRITE_MODES = ("insert", "copy")
+CONTENT_STORAGE = ("full", "params")
+
+# params is passed as one text literal per row ('{a,b}'), since unnest() can't
+# take an array of arrays of different lengths
+INSERT_QUERY = """
+    INSERT INTO {table} (template_id, source_id, raw_content, params)
+    SELECT id, source_id, content, params::text[]
+    FROM unnest($1::int[], $2::int[], $3::text[], $4::text[]) AS r(id, source_id, content, params)
+"""
+
+# Moves everything staged so far in a single statement. received_at is kept
+# from the staging row, so merged logs still land in the right time window.
+MERGE_STAGING_QUERY = f"""
+    WITH moved AS (
+        DELETE FROM {STAGING_TABLE}
+        RETURNING received_at, template_id, source_id, raw_content, params
+    )
+    INSERT INTO {LOGS_TABLE} (received_at, template_id, source_id, raw_content, params)
+    SELECT received_at, template_id, source_id, raw_content, params FROM moved
+"""
+
+# LOCALTIMESTAMP is the transaction start time, same as the received_at
+# default of the rows written in that transaction. (source, template) IDs come
+# sorted so concurrent writers lock rollup rows in the same order.
+ROLLUP_QUERY = """
+    INSERT INTO log_rollups (bucket, source_id, template_id, count)
+    SELECT date_trunc('second', LOCALTIMESTAMP), source_id, id, n
+    FROM unnest($1::int[], $2::int[], $3::int[]) AS r(source_id, id, n)
+    ON CONFLICT (bucket, source_id, template_id) DO UPDATE SET count = log_rollups.count + EXCLUDED.count
+"""
+
+MAINTAIN_PARTITIONS_QUERY = "SELECT created, dropped FROM logiq_maintain_partitions($1, $2)"
+
+
+def encode_rows(rows, ids, source_ids, content_storage):
+    """Yield (template_id, source_id, raw_content, params) records for the
+    logs table."""
+    if content_storage == "full":
+        for template, content, source in rows:
+            yield ids[template], source_ids[source], content, None
+        return
+    for template, content, source in rows:
+        params = split_params(template, content)
+        if params is None:
+            yield ids[template], source_ids[source], content, None
+        else:
+            yield ids[template], source_ids[source], None, params
+
+
+def _array_literal(values):
+    if values is None:
+        return None
+    quoted = ('"' + v.replace("\\", "\\\\").replace('"', '\\"') + '"' for v in values)
+    return "{" + ",".join(quoted) + "}"
+
+
+async def write_logs(conn, rows, templates, mode="copy", staging=False, content_storage="full", rollups=True,
+                     timings=None, sources=None):
+    """Write (template, content, source) rows, interning templates via
+    `templates` and sources via `sources` (None: every row is stored under
+    source 0, whatever its source). rollups=False leaves log_rollups alone
+    (e.g. for backfills of old logs, which aren't live traffic). If a
+    `timings` dict is given, the seconds spent resolving template and source
+    IDs, writing and committing are stored in it under "resolve", "write" and
+    "commit"."""
+    table = STAGING_TABLE if staging else LOGS_TABLE
+    if content_storage not in CONTENT_STORAGE:
+        raise ValueError(f"Unknown content storage {content_storage!r} (expected one of {CONTENT_STORAGE})")
+
+    # Two passes over the rows (template IDs first, then the write). This only
+    # collects references to the existing tuples, it doesn't copy them.
+    if not isinstance(rows, list):
+        rows = list(rows)
+    if mode not in WRITE_MODES:
+        raise ValueError(f"Unknown write mode {mode!r} (expected one of {WRITE_MODES})")
+    start = time.perf_counter()
+    counts = Counter((source, template) for template, _, source in rows)
+    ids = await templates.resolve(conn, {template for _, template in counts})
+    names = {source for source, _ in counts}
+    source_ids = await sources.resolve(conn, names) if sources is not None else dict.fromkeys(names, 0)
+    records = encode_rows(rows, ids, source_ids, content_storage)
+    rollup = Counter()
+    for (source, template), n in counts.items():
+        rollup[source_ids[source], ids[template]] += n
+    rollup = sorted((source_id, template_id, n) for (source_id, template_id), n in rollup.items())
+    resolved = time.perf_counter()
+
+    # Started and committed by hand (not "async with") so the commit can be
+    # timed on its own
+    transaction = conn.transaction()
+    await transaction.start()
+    try:
+        if mode == "copy":
+            # asyncpg encodes the records into COPY's binary format as it
+            # iterates, so they are never built up as a list.
+            await conn.copy_records_to_table(table, records=records, columns=LOG_COLUMNS)
+        else:
+            template_ids, row_source_ids, contents, params = [], [], [], []
+            for template_id, source_id, content, values in records:
+                template_ids.append(template_id)
+                row_source_ids.append(source_id)
+                contents.append(content)
+                params.append(_array_literal(values))
+            await conn.execute(INSERT_QUERY.format(table=table), template_ids, row_source_ids, contents, params)
+        if rollups:
+            await conn.execute(ROLLUP_QUERY, [s for s, _, _ in rollup], [i for _, i, _ in rollup],
+                               [n for _, _, n in rollup])
+    except BaseException:
+        await transaction.rollback()
+        raise
+    written = time.perf_counter()
+    await transaction.commit()
+    if timings is not None:
+        timings["resolve"] = resolved - start
+        timings["write"] = written - resolved
+        timings["commit"] = time.perf_counter() - written
+
+
+async def merge_staging(conn):
+    """Move staged rows into logs. Returns the number of rows merged."""
+    status = await conn.execute(MERGE_STAGING_QUERY)
+    # Status tag looks like "INSERT 0 <rows>"
+    return int(status.split()[-1])
+
+
+async def maintain_partitions(conn, hours_ahead, retention):
+    """Create upcoming hourly partitions, drop those older than `retention`
+    (a timedelta, or None to keep everything). Returns (created, dropped)."""
+    record = await conn.fetchrow(MAINTAIN_PARTITIONS_QUERY, hours_ahead, retention)
+    return record["created"], record["dropped"]
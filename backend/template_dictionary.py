@@ -0,0 +1,109 @@
+"""
+Template interning for the ingest path.
+
+Template text is stored once in known_templates and logs only carry its
+integer ID. TemplateDictionary resolves template -> ID through an in-process
+LRU cache; misses are inserted/looked up in one round trip and then cached.
+SourceDictionary does the same for log source names (sources table).
+"""
+
+from collections import OrderedDict
+
+# Inserts the templates we don't know yet and returns the IDs of all of them.
+# Rows inserted by the CTE aren't visible to the join in the same statement,
+# hence the UNION of both halves.
+RESOLVE_QUERY = """
+    WITH wanted AS (
+        SELECT DISTINCT unnest($1::text[]) AS template
+    ),
+    inserted AS (
+        INSERT INTO known_templates (template)
+        SELECT template FROM wanted
+        ON CONFLICT (template) DO NOTHING
+        RETURNING id, template
+    )
+    SELECT id, template FROM inserted
+    UNION ALL
+    SELECT k.id, k.template FROM known_templates k JOIN wanted USING (template)
+"""
+
+SOURCE_RESOLVE_QUERY = """
+    WITH wanted AS (
+        SELECT DISTINCT unnest($1::text[]) AS name
+    ),
+    inserted AS (
+        INSERT INTO sources (name)
+        SELECT name FROM wanted
+        ON CONFLICT (name) DO NOTHING
+        RETURNING id, name
+    )
+    SELECT id, name FROM inserted
+    UNION ALL
+    SELECT s.id, s.name FROM sources s JOIN wanted USING (name)
+"""
+
+# A template inserted concurrently by another connection is invisible to the
+# statement's snapshot; it shows up on the next attempt.
+MAX_RESOLVE_ATTEMPTS = 3
+
+
+class ResolveError(Exception):
+    """IDs still missing after MAX_RESOLVE_ATTEMPTS. Transient (the rows are
+    fine), so callers treat it like a dropped DB connection."""
+
+
+class TemplateDictionary:
+    resolve_query = RESOLVE_QUERY  # returns (id, <key column>) rows
+    key_column = "template"
+    kind = "templates"  # in stats() and errors
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._ids = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def resolve(self, conn, templates):
+        """Map each template in `templates` (an iterable of str) to its ID."""
+        ids = {}
+        missing = []
+        for template in templates:
+            template_id = self._ids.get(template)
+            if template_id is None:
+                missing.append(template)
+            else:
+                self._ids.move_to_end(template)
+                ids[template] = template_id
+        self.hits += len(ids)
+        self.misses += len(missing)
+
+        for _ in range(MAX_RESOLVE_ATTEMPTS):
+            if not missing:
+                break
+            for record in await conn.fetch(self.resolve_query, missing):
+                ids[record[self.key_column]] = record["id"]
+                self._put(record[self.key_column], record["id"])
+            missing = [t for t in missing if t not in ids]
+        if missing:
+            raise ResolveError(f"Could not resolve IDs for {len(missing)} {self.kind}")
+        return ids
+
+    def _put(self, template, template_id):
+        self._ids[template] = template_id
+        self._ids.move_to_end(template)
+        if len(self._ids) > self.capacity:
+            self._ids.popitem(last=False)
+
+    def stats(self):
+        return {
+            f"cached_{self.kind}": len(self._ids),
+            "cache_capacity": self.capacity,
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+        }
+
+
+class SourceDictionary(TemplateDictionary):
+    resolve_query = SOURCE_RESOLVE_QUERY
+    key_column = "name"
+    kind = "sources"
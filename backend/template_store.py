@@ -0,0 +1,163 @@
+"""
+Memory-bounded set of known templates for pattern detection
+(Detector.seen_templates).
+
+Templates only mask digits (drain.mask), so user names, paths and other
+non-numeric variables leak into them and the number of distinct templates
+keeps growing on real traffic. KnownTemplates never holds template text:
+
+- each template is reduced to its 64-bit hash (built-in hash(), so the store
+  is only valid within one process and is not checkpointed)
+- the most recently seen hashes live in an exact LRU tier (an OrderedDict of
+  ints, about LRU_ENTRY_BYTES each)
+- hashes evicted from the LRU spill into a Bloom filter of fixed size, a
+  bit array holding everything else ever seen
+
+Memory is fixed up front (memory_bytes, split between both tiers and the
+small set of filter hits on probation, see below). The price is false
+positives: a template that was never seen may test as known when the Bloom
+filter says so, and is then not reported. The filter is sized with
+`k` hash functions for `expected_templates`; past that the false-positive
+rate climbs, which stats() reports (false_positive_rate, estimated from the
+share of the filter's bits that are set).
+
+Hot templates are answered by the LRU alone (one dict lookup). The templates
+of a call that miss it are checked against the filter together, with NumPy.
+A filter hit is only promoted back into the LRU when it hits again soon
+after, so a working set larger than the LRU doesn't keep cycling through it.
+"""
+
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+# Measured size of one OrderedDict entry keyed by a 64-bit int
+LRU_ENTRY_BYTES = 140
+# Measured size of one set entry keyed by a 64-bit int
+PROBATION_ENTRY_BYTES = 90
+# Filter hits on probation are capped at this share of lru_size
+PROBATION_SHARE = 4
+# More probes cost more per lookup than they save in false positives
+MAX_HASH_FUNCTIONS = 8
+# Spreads hash() values (small ints hash to themselves) over all 64 bits
+MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+class KnownTemplates:
+    def __init__(self, memory_bytes=2 << 20, lru_size=10_000, expected_templates=200_000):
+        self.probation_size = max(lru_size // PROBATION_SHARE, 1)
+        exact_bytes = lru_size * LRU_ENTRY_BYTES + self.probation_size * PROBATION_ENTRY_BYTES
+        filter_bytes = memory_bytes - exact_bytes
+        if filter_bytes < 1:
+            raise ValueError(f"memory_bytes={memory_bytes} leaves no room for a filter next to "
+                             f"{lru_size} LRU entries and {self.probation_size} on probation "
+                             f"({exact_bytes} bytes)")
+        self.memory_bytes = memory_bytes
+        self.lru_size = lru_size
+        self._bits = np.zeros(filter_bytes, dtype=np.uint8)
+        self._m = filter_bytes * 8
+        # k = m/n * ln 2 minimizes the false-positive rate at n templates
+        spilled = max(expected_templates - lru_size, 1)
+        self.k = min(max(round(self._m / spilled * math.log(2)), 1), MAX_HASH_FUNCTIONS)
+        self._steps = np.arange(self.k, dtype=np.uint64)[:, None]
+        self.set_bits = 0
+        self.count = 0  # distinct templates added
+        self.spilled = 0  # templates moved from the LRU into the filter
+        # hash -> True if it is in the filter as well (promoted from it)
+        self._recent = OrderedDict()
+        # Filter hits waiting for a repeat hit to be promoted
+        self._probation = set()
+        self.hits = 0
+        self.filter_hits = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, template):
+        h = hash(template)
+        return h in self._recent or self._in_filter([h])[0]
+
+    def add(self, template):
+        """Remember `template`. Returns True if it was not known before."""
+        return bool(self.add_all((template,)))
+
+    def add_all(self, templates):
+        """Remember every template in `templates`. Returns the ones that were
+        not known before, in order."""
+        recent = self._recent
+        misses = []
+        hits = 0
+        for template in templates:
+            h = hash(template)
+            if h in recent:
+                recent.move_to_end(h)
+                hits += 1
+            else:
+                misses.append((template, h))
+        self.hits += hits
+        if not misses:
+            return []
+
+        new = []
+        evicted = []
+        probation = self._probation
+        for (template, h), known in zip(misses, self._in_filter([h for _, h in misses])):
+            if known:
+                self.filter_hits += 1
+                if h not in probation:
+                    if len(probation) >= self.probation_size:
+                        probation.clear()
+                    probation.add(h)
+                    continue
+                probation.discard(h)
+            elif h in recent:
+                continue  # given twice in this call
+            else:
+                new.append(template)
+            recent[h] = known
+            if len(recent) > self.lru_size:
+                old, filtered = recent.popitem(last=False)
+                if not filtered:
+                    evicted.append(old)
+        self.count += len(new)
+        if evicted:
+            self._spill(evicted)
+        return new
+
+    def _probes(self, hashes):
+        """(k, n) bit indexes of the hashes, by double hashing
+        (Kirsch-Mitzenmacher) on the two 32-bit halves of the mixed hash."""
+        mixed = np.array(hashes, dtype=np.int64).view(np.uint64) * MIX
+        low, high = mixed & np.uint64(0xFFFFFFFF), (mixed >> np.uint64(32)) | np.uint64(1)
+        return (low + self._steps * high) % np.uint64(self._m)
+
+    def _in_filter(self, hashes):
+        if not self.set_bits:
+            return [False] * len(hashes)
+        probes = self._probes(hashes)
+        return ((self._bits[probes >> np.uint64(3)] >> (probes & np.uint64(7)).astype(np.uint8)) & 1).all(axis=0).tolist()
+
+    def _spill(self, hashes):
+        probes = np.unique(self._probes(hashes))
+        byte, bit = probes >> np.uint64(3), (np.uint8(1) << (probes & np.uint64(7)).astype(np.uint8))
+        self.set_bits += int(np.count_nonzero((self._bits[byte] & bit) == 0))
+        np.bitwise_or.at(self._bits, byte, bit)
+        self.spilled += len(hashes)
+
+    def false_positive_rate(self):
+        """Estimated chance that a template never seen tests as known."""
+        return (self.set_bits / self._m) ** self.k
+
+    def stats(self):
+        return {
+            "known_templates": self.count,
+            "recent_templates": len(self._recent),
+            "filtered_templates": self.spilled,
+            "memory_bytes": self.memory_bytes,
+            "filter_bytes": self._bits.nbytes,
+            "hash_functions": self.k,
+            "false_positive_rate": self.false_positive_rate(),
+            "lru_hits": self.hits,
+            "filter_hits": self.filter_hits,
+        }
@@ -0,0 +1,48 @@
+"""Tests for ndjson_stream.NDJSONDecoder's handling of damaged compressed bodies."""
+
+import gzip
+import json
+import zlib
+
+import pytest
+
+from ndjson_stream import NDJSONDecoder
+
+zstandard = pytest.importorskip("zstandard")
+
+BODY = b"".join(json.dumps({"content": f"line {i}", "template": "line <NUM>"}).encode() + b"\n"
+                for i in range(2000))
+COMPRESS = {
+    "gzip": gzip.compress,
+    "zstd": lambda body: zstandard.ZstdCompressor().compress(body),
+}
+
+
+def decode(encoding, body):
+    decoder = NDJSONDecoder(encoding)
+    rows = [row for chunk in decoder.feed(body) for row in chunk]
+    return rows + [row for chunk in decoder.close() for row in chunk]
+
+
+@pytest.mark.parametrize("encoding", sorted(COMPRESS))
+def test_intact_body_decodes(encoding):
+    assert len(decode(encoding, COMPRESS[encoding](BODY))) == 2000
+
+
+@pytest.mark.parametrize("encoding", sorted(COMPRESS))
+def test_truncated_body_is_rejected(encoding):
+    compressed = COMPRESS[encoding](BODY)
+    with pytest.raises(ValueError, match="Truncated"):
+        decode(encoding, compressed[:len(compressed) // 2])
+
+
+def test_corrupt_zstd_body_raises_value_error():
+    compressed = COMPRESS["zstd"](BODY)
+    with pytest.raises(ValueError):
+        decode("zstd", compressed[:20] + bytes(40) + compressed[60:])
+
+
+def test_corrupt_gzip_body_raises_zlib_error():
+    compressed = COMPRESS["gzip"](BODY)
+    with pytest.raises(zlib.error):
+        decode("gzip", compressed[:20] + bytes(40) + compressed[60:])
@@ -0,0 +1,41 @@
+"""Tests for wire_format.BatchDecoder's validation of malformed batches."""
+
+import msgpack
+import pytest
+
+from wire_format import BatchDecoder, BatchEncoder, WireFormatError
+
+
+def pack(*batch):
+    return msgpack.packb(list(batch), use_bin_type=True)
+
+
+def test_round_trip():
+    encoder = BatchEncoder(source="host-1")
+    encoder.add("user <NUM> logged in", "user 42 logged in")
+    encoder.add("disk full", "disk full")
+    assert BatchDecoder().decode(encoder.encode()) == [
+        ("user <NUM> logged in", "user 42 logged in", "host-1"),
+        ("disk full", "disk full", "host-1"),
+    ]
+
+
+@pytest.mark.parametrize("new_templates", ["abc", ["ok", 7], {"a": "b"}])
+def test_new_templates_must_be_a_list_of_strings(new_templates):
+    decoder = BatchDecoder()
+    with pytest.raises(WireFormatError):
+        decoder.decode(pack(1, 0, new_templates, []))
+    assert decoder.templates == []
+
+
+@pytest.mark.parametrize("params", [[{"a": 1}], [[1, 2]], [5], {"0": "x"}])
+def test_params_must_be_a_list_of_strings(params):
+    with pytest.raises(WireFormatError):
+        BatchDecoder().decode(pack(1, 0, ["user <NUM> logged in"], [[0, params]]))
+
+
+def test_rejected_batch_keeps_decoder_state():
+    decoder = BatchDecoder()
+    with pytest.raises(WireFormatError):
+        decoder.decode(pack(1, 0, ["a <NUM>", None], []))
+    assert decoder.decode(pack(1, 0, ["a <NUM>"], [[0, ["1"]]])) == [("a <NUM>", "a 1", "")]
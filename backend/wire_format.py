@@ -0,0 +1,117 @@
+"""
+Dictionary-encoded batch format for agent -> backend transport.
+
+A batch is one msgpack array:
+
+    [1, first_id, [template, ...], [row, ...]]
+    [1, first_id, [template, ...], [row, ...], source]
+
+- 1 is the format version.
+- The template list holds only templates the receiver hasn't seen yet. They get
+  consecutive IDs starting at first_id. A standalone batch (one HTTP request)
+  starts at 0; on a persistent connection IDs keep counting up, so each
+  template crosses the wire once per connection.
+- Each row is [template_id, params]. params is the list of variable values
+  (see log_codec.split_params), or the full raw line as a string when the line
+  can't be rebuilt from its template.
+- source (optional) names the host or service all rows of the batch come
+  from; without it they get the empty source.
+"""
+
+import msgpack
+
+from log_codec import split_params, template_formatter
+
+FORMAT_VERSION = 1
+CONTENT_TYPE = "application/x-logiq-batch"
+
+
+class WireFormatError(ValueError):
+    pass
+
+
+class BatchEncoder:
+    """Builds batches; keep one instance per connection to reuse template IDs."""
+
+    def __init__(self, source=""):
+        self.source = source
+        self._ids = {}
+        self._new_templates = []
+        self._first_id = 0
+        self._rows = []
+
+    def add(self, template, content):
+        template_id = self._ids.get(template)
+        if template_id is None:
+            template_id = len(self._ids)
+            self._ids[template] = template_id
+            self._new_templates.append(template)
+        params = split_params(template, content)
+        self._rows.append([template_id, content if params is None else params])
+
+    def __len__(self):
+        return len(self._rows)
+
+    def encode(self):
+        batch = [FORMAT_VERSION, self._first_id, self._new_templates, self._rows]
+        if self.source:
+            batch.append(self.source)
+        payload = msgpack.packb(batch, use_bin_type=True)
+        self._first_id = len(self._ids)
+        self._new_templates = []
+        self._rows = []
+        return payload
+
+
+class BatchDecoder:
+    """Decodes batches; keep one instance per connection to honor template IDs."""
+
+    def __init__(self):
+        self.templates = []
+        self._formats = []  # per template ID: (bound str.format, value count)
+
+    def decode(self, payload):
+        """Returns the batch as a list of (template, content, source) rows."""
+        try:
+            version, first_id, new_templates, rows, *source = msgpack.unpackb(payload, raw=False)
+        except (ValueError, TypeError, msgpack.UnpackException) as e:
+            raise WireFormatError(f"Malformed batch: {e}")
+        source = source[0] if source else ""
+        if type(source) is not str:
+            raise WireFormatError("Malformed batch: source must be a string")
+        if version != FORMAT_VERSION:
+            raise WireFormatError(f"Unsupported batch version {version}")
+        if first_id != len(self.templates):
+            raise WireFormatError(f"Batch starts at template {first_id}, expected {len(self.templates)}")
+        if type(new_templates) is not list or any(type(t) is not str for t in new_templates):
+            raise WireFormatError("Malformed batch: new templates must be a list of strings")
+        formats = []
+        for template in new_templates:
+            fmt, expected = template_formatter(template)
+            formats.append((fmt.format, expected))
+        self._formats.extend(formats)
+        self.templates.extend(new_templates)
+
+        templates = self.templates
+        formats = self._formats
+        decoded = []
+        try:
+            for template_id, params in rows:
+                if template_id < 0:
+                    raise IndexError(f"template id {template_id}")
+                template = templates[template_id]
+                if type(params) is str:
+                    decoded.append((template, params, source))
+                    continue
+                render, expected = formats[template_id]
+                if type(params) is not list:
+                    raise TypeError(f"params must be a list or a string, got {type(params).__name__}")
+                if len(params) != expected:
+                    raise ValueError(f"template {template_id} expects {expected} values, got {len(params)}")
+                # join() raises TypeError unless every value is a str, at C
+                # speed (str.format would take anything and str() it)
+                "".join(params)
+                decoded.append((template, render(*params), source))
+        except (ValueError, TypeError, IndexError) as e:
+            raise WireFormatError(f"Malformed row: {e}")
+        return decoded
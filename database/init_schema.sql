@@ -1,8 +1,148 @@
-CREATE TABLE IF NOT EXISTS logs (
+-- Dictionary of every template seen at least once. Each template's text is
+-- stored here once; logs refer to it by the compact integer id. The ingest
+-- service caches template -> id in memory and adds new templates on first
+-- sight, so entries are never deleted while it runs.
+CREATE TABLE IF NOT EXISTS known_templates (
+    id SERIAL PRIMARY KEY,
+    template TEXT NOT NULL UNIQUE,
+    first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- When the analyzer first saw the template in a window; NULL while it is
+    -- new to the analyzer (new-template detection is an anti-join on this)
+    learned_at TIMESTAMP
+);
+
+-- Dictionary of log sources (host, service, ... whatever the shipper sends
+-- as "source"), interned the same way as templates. Id 0 is the empty
+-- source, used for logs that don't name one.
+CREATE TABLE IF NOT EXISTS sources (
     id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO sources (id, name) VALUES (0, '') ON CONFLICT DO NOTHING;
+
+-- template_id refers to known_templates.id and source_id to sources.id (no FK
+-- constraints, to keep COPY ingest free of per-row trigger checks).
+-- With RAW_CONTENT_STORAGE = "params" (backend/main.py) a row keeps only the
+-- variable values of its line in params and raw_content is NULL; raw_content
+-- is only filled for lines that can't be rebuilt from their template. Read
+-- through logs_full to get the original lines back.
+--
+-- logs is range-partitioned by received_at into hourly partitions
+-- (logs_pYYYYMMDD_HH), so time-window queries only scan the newest partition
+-- and retention drops whole partitions instead of deleting rows. Partitions
+-- are created ahead of time by logiq_maintain_partitions() below, which the
+-- ingest service runs periodically; logs_default catches rows outside every
+-- partition (e.g. if maintenance didn't run for a while).
+CREATE TABLE IF NOT EXISTS logs (
+    id SERIAL,
+    received_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    template_id INT,
+    source_id INT NOT NULL DEFAULT 0,
+    raw_content TEXT,
+    params TEXT[],
+    PRIMARY KEY (id, received_at)
+) PARTITION BY RANGE (received_at);
+
+CREATE TABLE IF NOT EXISTS logs_default PARTITION OF logs DEFAULT;
+
+-- Per-second log counts by source and template, maintained by the ingest
+-- service in the same transaction as the log rows (backend/storage.py). The
+-- analyzers read their windows from here instead of scanning logs. bucket is
+-- received_at truncated to the second.
+CREATE TABLE IF NOT EXISTS log_rollups (
+    bucket TIMESTAMP NOT NULL,
+    source_id INT NOT NULL DEFAULT 0,
+    template_id INT NOT NULL,
+    count INT NOT NULL,
+    PRIMARY KEY (bucket, source_id, template_id)
+);
+
+-- Create the hourly partitions from the current hour up to hours_ahead hours
+-- ahead, and drop partitions whose whole range is older than retention.
+-- Rollups older than the retention are deleted along with them.
+-- Returns the number of partitions created and dropped. A partition can't be
+-- created while logs_default holds rows in its range; that hour is skipped
+-- with a warning and its rows stay in logs_default.
+CREATE OR REPLACE FUNCTION logiq_maintain_partitions(
+    hours_ahead INT DEFAULT 3,
+    retention INTERVAL DEFAULT '24 hours',
+    OUT created INT,
+    OUT dropped INT
+) LANGUAGE plpgsql AS $$
+DECLARE
+    hour_start TIMESTAMP;
+    part RECORD;
+    part_name TEXT;
+BEGIN
+    created := 0;
+    dropped := 0;
+    FOR i IN 0..hours_ahead LOOP
+        hour_start := date_trunc('hour', LOCALTIMESTAMP) + make_interval(hours => i);
+        part_name := 'logs_p' || to_char(hour_start, 'YYYYMMDD_HH24');
+        CONTINUE WHEN to_regclass(part_name) IS NOT NULL;
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF logs FOR VALUES FROM (%L) TO (%L)',
+                part_name, hour_start, hour_start + INTERVAL '1 hour'
+            );
+            created := created + 1;
+        EXCEPTION WHEN check_violation THEN
+            RAISE WARNING 'logs_default has rows for %, not creating %', hour_start, part_name;
+        END;
+    END LOOP;
+
+    IF retention IS NOT NULL THEN
+        FOR part IN
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'logs'::regclass AND c.relname ~ '^logs_p\d{8}_\d{2}$'
+        LOOP
+            -- The partition covers [hour, hour + 1h)
+            IF to_timestamp(substr(part.relname, 7), 'YYYYMMDD_HH24')::timestamp + INTERVAL '1 hour'
+                    <= LOCALTIMESTAMP - retention THEN
+                EXECUTE format('DROP TABLE %I', part.relname);
+                dropped := dropped + 1;
+            END IF;
+        END LOOP;
+        DELETE FROM log_rollups WHERE bucket < LOCALTIMESTAMP - retention;
+    END IF;
+END;
+$$;
+
+SELECT * FROM logiq_maintain_partitions();
+
+-- Rebuild a line from its template and variable values (same rules as
+-- backend/log_codec.py: the i-th value replaces the i-th placeholder).
+CREATE OR REPLACE FUNCTION logiq_render(template TEXT, params TEXT[]) RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT string_agg(part || COALESCE(params[i], ''), '' ORDER BY i)
+    FROM unnest(regexp_split_to_array(template, '<IP>|<HEX>|<NUM>')) WITH ORDINALITY AS p(part, i)
+$$;
+
+CREATE OR REPLACE VIEW logs_full AS
+SELECT
+    l.id,
+    l.received_at,
+    l.template_id,
+    t.template AS log_template,
+    s.name AS source,
+    COALESCE(l.raw_content, logiq_render(t.template, l.params)) AS raw_content
+FROM logs l
+LEFT JOIN known_templates t ON t.id = l.template_id
+LEFT JOIN sources s ON s.id = l.source_id;
+
+-- Optional write buffer for very high ingest rates (see USE_STAGING_TABLE in
+-- backend/main.py). UNLOGGED skips WAL, so staged rows are lost on a crash;
+-- the ingest service merges them into logs every few hundred milliseconds.
+CREATE UNLOGGED TABLE IF NOT EXISTS logs_staging (
     received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    log_template TEXT,
-    raw_content TEXT
+    template_id INT,
+    source_id INT NOT NULL DEFAULT 0,
+    raw_content TEXT,
+    params TEXT[]
 );
 
 CREATE TABLE IF NOT EXISTS anomalies (
@@ -15,13 +155,5 @@ CREATE TABLE IF NOT EXISTS anomalies (
     is_true BOOLEAN
 );
 
--- Persistent record of templates we've already seen at least once.
--- This lets pattern anomalies fire only the first time a template appears,
--- even across restarts.
-CREATE TABLE IF NOT EXISTS known_templates (
-    template TEXT PRIMARY KEY,
-    first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-
--- Index for faster time-based querying
+-- Index for faster time-based querying (created on every partition)
 CREATE INDEX idx_logs_time ON logs(received_at);